@@ -0,0 +1,37 @@
+"""
+Times `import pyelan` in fresh interpreters and lists the slowest modules it pulls in (from python -X importtime), to catch imports that make the cli tools and worker processes slow to start.
+
+python -m benchmarks.bench_import --repeats 20 --top 15
+"""
+import argparse, subprocess, sys
+
+def importTimes(module):
+    """Returns {module: (self us, cumulative us)} for one import of module in a fresh interpreter"""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module], capture_output=True, text=True, check=True).stderr
+    times = {}
+    for line in out.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        selfUs, cumulativeUs, name = line[len("import time:"):].split("|")
+        if selfUs.strip().isdigit():
+            times[name.strip()] = (int(selfUs), int(cumulativeUs))
+    return times
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--module", default="pyelan")
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--top", type=int, default=10, help="how many of the slowest imports to list")
+    args = parser.parse_args(argv)
+
+    # the first run compiles and caches bytecode, so it is not counted
+    importTimes(args.module)
+    runs = [importTimes(args.module) for n in range(args.repeats)]
+    totals = sorted(run[args.module][1] for run in runs)
+    print("import %s: best %.1fms  median %.1fms  (%d runs)" % (args.module, totals[0] / 1000., totals[len(totals) // 2] / 1000., len(totals)))
+    best = {name: min(run[name][1] for run in runs if name in run) for name in runs[0]}
+    for name, us in sorted(best.items(), key=lambda item: -item[1])[1:args.top + 1]:
+        print("  %-40s %8.1fms" % (name, us / 1000.))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Compares how well (and how quickly) different scores pick the right file when a corpus has moved and many files share a name.
+
+python -m benchmarks.bench_pathmatch --sessions 200 --depth 6
+"""
+import argparse, os, random, tempfile, time
+
+from pyelan.pyelan import dirIndex, lcs, suffixScore
+
+def aliasedLcs(string1, string2):
+    """The lcs from before the two row rewrite, where every row of the table aliased the same list"""
+    m = len(string1)
+    n = len(string2)
+
+    C = [[0] * (n + 1)] * (m + 1)
+    for i in range(m + 1)[1:]:
+        for j in range(n + 1)[1:]:
+            if string1[i - 1] == string2[j - 1]:
+                C[i][j] = C[i - 1][j - 1] + 1
+            else:
+                C[i][j] = max(C[i][j - 1], C[i - 1][j])
+    return C[m][n]
+
+def makeTree(root, sessions, depth, seed=0):
+    """Makes a tree of sessions, each nested depth directories deep, that all contain a file called video.mov, plus a shallow decoy copy of each session. Returns the relative paths of the real files."""
+    rand = random.Random(seed)
+    relPaths = []
+    for n in range(sessions):
+        parts = ["participant%03d" % (n % 20)] + ["level%d_%02d" % (d, rand.randrange(5)) for d in range(depth - 2)] + ["session%04d" % n]
+        os.makedirs(os.path.join(root, *parts), exist_ok=True)
+        relPath = os.path.join(*(parts + ["video.mov"]))
+        open(os.path.join(root, relPath), "w").close()
+        relPaths.append(relPath)
+        decoy = os.path.join(root, "exports", "session%04d" % n)
+        os.makedirs(decoy, exist_ok=True)
+        open(os.path.join(decoy, "video.mov"), "w").close()
+    return relPaths
+
+def rank(score, oldPath, candidates):
+    scores = [score(oldPath, pt) for pt in candidates]
+    return candidates[scores.index(max(scores))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--depth", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        relPaths = makeTree(root, args.sessions, args.depth)
+        start = time.perf_counter()
+        index = dirIndex(root)
+        print("index: %d files in %.4fs" % (sum(len(paths) for paths in index.paths.values()), time.perf_counter() - start))
+
+        queries = relPaths[:args.queries]
+        candidates = sorted(index.matches("video.mov"))
+        scorers = [("aliased lcs (old)", aliasedLcs), ("two row lcs", lcs), ("path suffix", suffixScore)]
+        for name, score in scorers:
+            correct = 0
+            start = time.perf_counter()
+            for relPath in queries:
+                oldPath = os.path.join("/moved/corpus/root", relPath)
+                if rank(score, oldPath, candidates) == os.path.join(root, relPath):
+                    correct += 1
+            elapsed = time.perf_counter() - start
+            print("%-18s %5.1f%% correct  %.4fs per lookup" % (name, 100. * correct / len(queries), elapsed / len(queries)))
+
+if __name__ == "__main__":
+    main()
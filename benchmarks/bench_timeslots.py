@@ -0,0 +1,42 @@
+"""
+Compares the size and load time of elan files written with a pair of time slots per annotation and with shared, deduplicated time slots.
+
+python -m benchmarks.bench_timeslots --tiers 10 --annotations 10000
+"""
+import argparse, os, random, tempfile, time
+
+from pyelan.pyelan import annotation, tier, tierSet
+
+def makeTierSet(tiers, annotations, seed=0):
+    """Makes tiers of back to back annotations whose boundaries fall on a shared grid, so many times are shared within and across tiers"""
+    rand = random.Random(seed)
+    grid = [n * 40 for n in range(annotations * 2)]
+    tierList = []
+    for t in range(tiers):
+        begin = 0
+        annos = []
+        for n in range(annotations):
+            end = grid[min(len(grid) - 1, begin // 40 + rand.randint(1, 3))]
+            annos.append(annotation(begin, end, "gloss%d" % rand.randrange(50)))
+            begin = end
+        tierList.append(tier("tier%d" % t, annos))
+    return tierSet(media=[], tiers=tierList, pathELAN=".")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tiers", type=int, default=5)
+    parser.add_argument("--annotations", type=int, default=5000)
+    args = parser.parse_args()
+
+    tiers = makeTierSet(args.tiers, args.annotations)
+    with tempfile.TemporaryDirectory() as root:
+        for shared in (False, True):
+            dest = os.path.join(root, "shared.eaf" if shared else "pairs.eaf")
+            tierSet.writeElan(tiers, dest=dest, sharedTimeSlots=shared)
+            start = time.perf_counter()
+            tierSet(file=dest)
+            elapsed = time.perf_counter() - start
+            print("%-14s %10d bytes  load %.4fs" % ("shared slots" if shared else "slot pairs", os.path.getsize(dest), elapsed))
+
+if __name__ == "__main__":
+    main()
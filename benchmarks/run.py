@@ -0,0 +1,112 @@
+"""
+Times the main parse, query, export and relink paths on a synthetic corpus, records peak memory, and saves the results as json so they can be compared across commits.
+
+python -m benchmarks.run --out results.json
+python -m benchmarks.run --annotations 20000 --compare results.json
+"""
+import argparse, json, os, platform, shutil, subprocess, tempfile, time, tracemalloc, warnings
+
+from pyelan.pyelan import tierSet, timeSeries, dirIndex, findPathMatch
+from pyelan.relPathFix import relinkFiles
+from pyelan.table import readTable
+from . import synthetic
+
+def benchmarks(args, root):
+    """Returns (name, setup, run) for each benchmark. setup runs untimed before each repeat and its result is passed to run."""
+    eafs = synthetic.makeCorpus(os.path.join(root, "corpus"), files=1, tiers=args.tiers, annotations=args.annotations, depth=args.depth)
+    eaf = eafs[0]
+    loaded = tierSet(file=eaf)
+    tsconf = loaded.linkedFiles[0]
+    ts = timeSeries(file=tsconf)
+    lastEnd = max(tr.annotations[-1].end for tr in loaded.tiers)
+    windows = [(begin, begin + 5000) for begin in range(0, lastEnd, max(lastEnd // args.clips, 1))][:args.clips]
+
+    movedRoot = os.path.join(root, "moved")
+    synthetic.makeCorpus(movedRoot, files=args.files, tiers=2, annotations=10, depth=args.depth, movedFrom="/old/location")
+    oldMedia = "/old/location/data/" + os.path.relpath(dirIndex(movedRoot).matches("session0000.mov")[0], os.path.join(movedRoot, "data"))
+
+    def freshMovedCorpus():
+        target = os.path.join(root, "relink")
+        shutil.rmtree(target, ignore_errors=True)
+        shutil.copytree(movedRoot, target)
+        return sorted(os.path.join(target, fl) for fl in os.listdir(target) if fl.endswith(".eaf")), target
+
+    def relink(state):
+        files, target = state
+        relinkFiles(files, searchDir=target, workers=1)
+
+    return [
+        ("extractTiers", None, lambda state: tierSet(file=eaf)),
+        ("miniTier", None, lambda state: [tierSet.miniTier(loaded, begin, end) for begin, end in windows]),
+        ("segment", None, lambda state: tierSet.segment(loaded, windows, os.path.join(root, "clips", "{n}.eaf"))),
+        ("selectedTiers", None, lambda state: tierSet.selectedTiers(loaded, ["tier0"])),
+        ("elanOut", None, lambda state: tierSet.elanOut(loaded, dest=os.path.join(root, "out.eaf")).write(os.path.join(root, "out.eaf"))),
+        ("tableOut", None, lambda state: tierSet.tableOut(loaded, os.path.join(root, "out.table"), source=eaf)),
+        ("readTable", lambda: tierSet.tableOut(loaded, os.path.join(root, "in.table"), source=eaf), lambda state: readTable(os.path.join(root, "in.table")).tierSets()),
+        ("timeSeriesOut", None, lambda state: timeSeries.timeSeriesOut(ts)[0].write(os.path.join(root, "out_tsconf.xml"))),
+        ("findPathMatch", None, lambda state: findPathMatch(oldMedia, searchDir=movedRoot)),
+        ("relPathFix", freshMovedCorpus, relink),
+    ]
+
+def measure(setup, run, repeats):
+    """Times run over repeats (after an untimed setup each time), then runs it once more under tracemalloc for its peak memory"""
+    times = []
+    for n in range(repeats):
+        state = setup() if setup else None
+        start = time.perf_counter()
+        run(state)
+        times.append(time.perf_counter() - start)
+    state = setup() if setup else None
+    tracemalloc.start()
+    run(state)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"best": min(times), "mean": sum(times) / len(times), "peakBytes": peak}
+
+def gitCommit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, old):
+    """Prints the change in best time and peak memory against a previous results file"""
+    print("\n%-15s %12s %12s %9s %12s" % ("vs " + (old.get("commit") or "previous")[:10], "old best", "new best", "speedup", "peak ratio"))
+    for name, new in results["results"].items():
+        if name not in old["results"]:
+            continue
+        prev = old["results"][name]
+        print("%-15s %11.4fs %11.4fs %8.2fx %11.2fx" % (name, prev["best"], new["best"], prev["best"] / new["best"] if new["best"] else float("inf"), new["peakBytes"] / prev["peakBytes"] if prev["peakBytes"] else float("inf")))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tiers", type=int, default=5)
+    parser.add_argument("--annotations", type=int, default=2000, help="annotations per tier")
+    parser.add_argument("--files", type=int, default=20, help="files in the corpus for the relinking benchmarks")
+    parser.add_argument("--depth", type=int, default=3, help="directory depth of the corpus")
+    parser.add_argument("--clips", type=int, default=100, help="windows for miniTier")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--only", nargs="*", help="only run these benchmarks")
+    parser.add_argument("--out", help="save the results to this json file")
+    parser.add_argument("--compare", help="compare against a previous json results file")
+    args = parser.parse_args(argv)
+
+    warnings.simplefilter("ignore")
+    params = {key: getattr(args, key) for key in ("tiers", "annotations", "files", "depth", "clips", "repeats")}
+    results = {"commit": gitCommit(), "python": platform.python_version(), "params": params, "results": {}}
+    with tempfile.TemporaryDirectory() as root:
+        for name, setup, run in benchmarks(args, root):
+            if args.only and name not in args.only:
+                continue
+            results["results"][name] = result = measure(setup, run, args.repeats)
+            print("%-15s best %.4fs  mean %.4fs  peak %8.1f KiB" % (name, result["best"], result["mean"], result["peakBytes"] / 1024.))
+
+    if args.out:
+        with open(args.out, "w") as fl:
+            json.dump(results, fl, indent=2)
+    if args.compare:
+        with open(args.compare) as fl:
+            compare(results, json.load(fl))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Synthetic elan and tsconf corpora for benchmarking, scaled by the number of tiers, annotations, files, and directory depth.
+"""
+import os, random
+
+from pyelan.pyelan import annotation, tier, tierSet, timeSeries, track
+
+def makeTierSet(tiers=5, annotations=1000, media=None, linkedFiles=None, seed=0):
+    """Makes a tierSet of back to back annotations (of 1 to 3 grid steps of 40ms, with a gap now and then) on each tier"""
+    rand = random.Random(seed)
+    tierList = []
+    for t in range(tiers):
+        begin = 0
+        annos = []
+        for n in range(annotations):
+            end = begin + 40 * rand.randint(1, 3)
+            annos.append(annotation(begin, end, "gloss%d" % rand.randrange(50)))
+            begin = end + 40 * rand.randint(0, 1)
+        tierList.append(tier("tier%d" % t, annos))
+    return tierSet(media=media or [], linkedFiles=linkedFiles, tiers=tierList, pathELAN=".")
+
+def makeTimeSeries(source, tracks=3, samples=100, seed=0):
+    """Writes a csv of samples (a time column followed by one column per track) to source and returns a timeSeries for it"""
+    rand = random.Random(seed)
+    with open(source, "w") as fl:
+        for n in range(samples):
+            fl.write(",".join([str(n * 10)] + ["%.3f" % rand.uniform(0, 100) for t in range(tracks)]) + "\n")
+    trackList = [track("track%d" % t, t + 1, range=[0, 100], properties={}) for t in range(tracks)]
+    return timeSeries(source=source, tracks=trackList)
+
+def makeCorpus(root, files=10, tiers=5, annotations=1000, depth=3, samples=100, movedFrom=None, seed=0):
+    """
+    Writes a corpus of files elan files under root, each with a media file and a tsconf (and csv) nested depth directories deep under root/data.
+    If movedFrom is given, the links in the elan and tsconf files point at movedFrom instead of root, as if the corpus had been moved there from movedFrom.
+    Returns the paths of the elan files.
+    """
+    rand = random.Random(seed)
+    linkRoot = movedFrom or root
+    eafs = []
+    for n in range(files):
+        parts = ["data"] + ["level%d_%d" % (d, rand.randrange(3)) for d in range(max(depth - 1, 0))] + ["session%04d" % n]
+        dataDir = os.path.join(root, *parts)
+        linkDir = os.path.join(linkRoot, *parts)
+        os.makedirs(dataDir, exist_ok=True)
+
+        open(os.path.join(dataDir, "session%04d.mov" % n), "w").close()
+        ts = makeTimeSeries(os.path.join(dataDir, "session%04d.csv" % n), samples=samples, seed=seed + n)
+        ts.source = os.path.join(linkDir, "session%04d.csv" % n)
+        timeSeries.timeSeriesOut(ts)[0].write(os.path.join(dataDir, "session%04d_tsconf.xml" % n))
+
+        tiers_ = makeTierSet(tiers, annotations, media=[os.path.join(linkDir, "session%04d.mov" % n)],
+                             linkedFiles=[os.path.join(linkDir, "session%04d_tsconf.xml" % n)], seed=seed + n)
+        eaf = os.path.join(root, "session%04d.eaf" % n)
+        tierSet.writeElan(tiers_, dest=eaf)
+        eafs.append(eaf)
+    return eafs
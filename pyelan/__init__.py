@@ -1,2 +1,18 @@
 from . import pyelan
-from .pyelan import annotation, tier, tierSet, noMediaError
\ No newline at end of file
+from .pyelan import annotation, tier, columnarTier, tierSet, joinTiers, dirIndex, findPathMatch, noMediaError
+from .corpus import corpusSet, loadCorpus, iterCorpus
+from . import instrument
+
+# the cache, aggregation, and table helpers (and what they import) are only loaded when first used
+_lazy = {"fileCache": "cache", "aggregateTier": "aggregate", "writeTable": "table", "readTable": "table", "annotationTable": "table"}
+
+def __getattr__(name):
+    if name in _lazy:
+        import importlib
+        value = getattr(importlib.import_module("." + _lazy[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy))
\ No newline at end of file
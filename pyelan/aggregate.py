@@ -0,0 +1,111 @@
+import array, bisect, math
+from .pyelan import _framesToMillis
+
+STATS = ("mean", "min", "max", "peakTime")
+
+def aggregateTier(tr, ts, tracks=None, stats=STATS, fps=(60.*(1000./1001.))):
+    """
+    Computes statistics of time series tracks over every annotation in a tier, returning them as columns, without taking a slice of the samples per annotation.
+    The sample rows of each annotation are found with a sorted search of the sample times (which must be sorted), then one sweep over the annotation boundaries reduces each stretch of samples between them once, building prefix sums for the means and merging min, max, and peakTime into the annotations covering it.
+    stats can include mean, min, max, and peakTime (the time of the first maximum, in annotation time). Missing samples (nan) are skipped. Annotations in frames are converted to milliseconds with fps (as framesToMillis does), and timeOrigin on the time series is honored.
+    Returns a dictionary with begin, end, and value columns (in tier order) along with a column of doubles called track_stat for each track and statistic (nan where an annotation has no samples).
+    """
+    unknown = set(stats) - set(STATS)
+    if unknown:
+        raise ValueError("Unknown statistics: " + ", ".join(sorted(unknown)))
+    annos = tr.annotations
+    trackList = ts.tracks if tracks is None else [ts.getTrack(name) for name in tracks]
+    origin = ts.timeOrigin or 0
+    data = ts.samples()
+    times = data.times()
+    columns = [(trk.name, data.column(trk.column)) for trk in trackList]
+
+    begins = [anno.begin for anno in annos]
+    ends = [anno.end for anno in annos]
+    inFrames = [i for i, anno in enumerate(annos) if anno.units == "frames"]
+    if inFrames:
+        frameBegins, frameEnds = _framesToMillis([begins[i] for i in inFrames], [ends[i] for i in inFrames], fps)
+        for i, begin, end in zip(inFrames, frameBegins, frameEnds):
+            begins[i] = begin
+            ends[i] = end
+
+    nan = float("nan")
+    result = {"begin": begins, "end": ends, "value": [anno.value for anno in annos]}
+    for name, values in columns:
+        for stat in stats:
+            result["%s_%s" % (name, stat)] = array.array('d', [nan]) * len(annos)
+
+    # the sample rows (lo up to hi) of each annotation, searched from where the last (by beginning) annotation's search started
+    los = [0] * len(annos)
+    his = [0] * len(annos)
+    lo = 0
+    for i in sorted(range(len(annos)), key=begins.__getitem__):
+        lo = bisect.bisect_left(times, begins[i] + origin, lo)
+        los[i] = lo
+        his[i] = max(lo, bisect.bisect_right(times, ends[i] + origin, lo))
+    nonEmpty = [i for i in range(len(annos)) if his[i] > los[i]]
+
+    # the samples between consecutive annotation boundaries are covered by the same annotations, so the sweep reduces each of these segments once:
+    # its sum and count extend prefix sums (taken at the boundaries) for the means, and its min and max are merged into every annotation active over it
+    boundaries = sorted(set(los[i] for i in nonEmpty) | set(his[i] for i in nonEmpty))
+    position = {boundary: k for k, boundary in enumerate(boundaries)}
+    sums = [[0.] * len(boundaries) for name, values in columns]
+    counts = [[0] * len(boundaries) for name, values in columns]
+    mins = [[nan] * len(annos) for name, values in columns]
+    maxs = [[nan] * len(annos) for name, values in columns]
+    peaks = [[0] * len(annos) for name, values in columns]
+    starts = sorted(nonEmpty, key=los.__getitem__)
+    stops = sorted(nonEmpty, key=his.__getitem__)
+    active = {}
+    s = e = 0
+    for k in range(len(boundaries) - 1):
+        a, b = boundaries[k], boundaries[k + 1]
+        while e < len(stops) and his[stops[e]] <= a:
+            del active[stops[e]]
+            e += 1
+        while s < len(starts) and los[starts[s]] <= a:
+            active[starts[s]] = None
+            s += 1
+        for t, (name, values) in enumerate(columns):
+            sums[t][k + 1] = sums[t][k]
+            counts[t][k + 1] = counts[t][k]
+            if not active:
+                # no annotation covers these samples, so they are never part of a mean
+                continue
+            segment = values[a:b].tolist()
+            valid = segment
+            total = math.fsum(segment)
+            if total != total:
+                # missing samples (nan) are skipped
+                valid = [value for value in segment if value == value]
+                total = math.fsum(valid)
+            sums[t][k + 1] += total
+            counts[t][k + 1] += len(valid)
+            if not valid:
+                continue
+            low, high = min(valid), max(valid)
+            peak = a + segment.index(high)
+            trackMins, trackMaxs, trackPeaks = mins[t], maxs[t], peaks[t]
+            for i in active:
+                # comparisons with nan are false, so the first segment always sets both, and later segments only move the peak for a larger maximum
+                if not low >= trackMins[i]:
+                    trackMins[i] = low
+                if not high <= trackMaxs[i]:
+                    trackMaxs[i] = high
+                    trackPeaks[i] = peak
+
+    for t, (name, values) in enumerate(columns):
+        for i in nonEmpty:
+            lo, hi = position[los[i]], position[his[i]]
+            n = counts[t][hi] - counts[t][lo]
+            if not n:
+                continue
+            if "mean" in stats:
+                result[name + "_mean"][i] = (sums[t][hi] - sums[t][lo]) / n
+            if "min" in stats:
+                result[name + "_min"][i] = mins[t][i]
+            if "max" in stats:
+                result[name + "_max"][i] = maxs[t][i]
+            if "peakTime" in stats:
+                result[name + "_peakTime"][i] = times[peaks[t][i]] - origin
+    return result
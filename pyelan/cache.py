@@ -0,0 +1,114 @@
+import os, pickle, hashlib
+from collections import OrderedDict
+from . import pyelan
+
+def _keyValue(value):
+    """Turns list and set arguments (e.g. tierNames) into tuples so they can be part of a cache key. Sets are sorted, so the key (and the name of its file on disk) is the same in every process."""
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(value))
+    if isinstance(value, (list, tuple)):
+        return tuple(_keyValue(item) for item in value)
+    return value
+
+class fileCache:
+    """
+    An opt-in cache of parsed tierSets and timeSeries, so that files opened again and again are only parsed once.
+    Parsed objects are kept (pickled) in an in-process LRU that evicts the least recently used files once maxBytes is exceeded, and optionally in cacheDir on disk so that other processes and later runs can use them too.
+    Entries are invalidated when the file's modification time or size change, or its content changes if useHash is True. Every lookup returns a new object, so changing it does not change the cache.
+    """
+    def __init__(self, maxBytes=256 * 2**20, cacheDir=None, useHash=False):
+        self.maxBytes = maxBytes
+        self.cacheDir = cacheDir
+        self.useHash = useHash
+        self.entries = OrderedDict()
+        self.nBytes = 0
+        self.hits = 0
+        self.diskHits = 0
+        self.misses = 0
+        self.evictions = 0
+        if cacheDir is not None:
+            os.makedirs(cacheDir, exist_ok=True)
+
+    def tierSet(self, file, **kwargs):
+        """Returns the tierSet for an elan file (kwargs are passed on to tierSet)"""
+        return self._get("tierSet", file, kwargs, lambda: pyelan.tierSet(file=file, **kwargs))
+
+    def timeSeries(self, file):
+        """Returns the timeSeries for a tsconf file"""
+        return self._get("timeSeries", file, {}, lambda: pyelan.timeSeries(file=file))
+
+    def stats(self):
+        """Returns the hit, miss and eviction counters along with the current size of the in-process cache"""
+        return {"hits": self.hits, "diskHits": self.diskHits, "misses": self.misses, "evictions": self.evictions, "entries": len(self.entries), "bytes": self.nBytes}
+
+    def clear(self):
+        """Empties the in-process cache (files cached on disk are kept)"""
+        self.entries.clear()
+        self.nBytes = 0
+
+    def signature(self, file):
+        """Identifies the current version of a file by its modification time and size, or by a hash of its contents"""
+        if self.useHash:
+            with open(file, "rb") as fl:
+                return hashlib.sha1(fl.read()).hexdigest()
+        st = os.stat(file)
+        return (st.st_mtime_ns, st.st_size)
+
+    def _get(self, kind, file, kwargs, build):
+        key = (kind, os.path.abspath(file), tuple(sorted((name, _keyValue(value)) for name, value in kwargs.items())))
+        signature = self.signature(file)
+
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] == signature:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return pickle.loads(entry[1])
+
+        data = self._load(key, signature)
+        if data is not None:
+            self.diskHits += 1
+            obj = pickle.loads(data)
+        else:
+            self.misses += 1
+            obj = build()
+            data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+            self._save(key, signature, data)
+        self._store(key, signature, data)
+        return obj
+
+    def _store(self, key, signature, data):
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.nBytes -= len(old[1])
+        self.entries[key] = (signature, data)
+        self.nBytes += len(data)
+        while self.nBytes > self.maxBytes and len(self.entries) > 1:
+            oldKey, (oldSignature, oldData) = self.entries.popitem(last=False)
+            self.nBytes -= len(oldData)
+            self.evictions += 1
+
+    def _diskPath(self, key):
+        return os.path.join(self.cacheDir, hashlib.sha1(repr(key).encode("utf-8")).hexdigest() + ".pickle")
+
+    def _load(self, key, signature):
+        """Reads an entry from the disk cache, if there is one for this version of the file"""
+        if self.cacheDir is None:
+            return None
+        try:
+            with open(self._diskPath(key), "rb") as fl:
+                cachedSignature, data = pickle.load(fl)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            return None
+        if cachedSignature != signature:
+            return None
+        return data
+
+    def _save(self, key, signature, data):
+        """Writes an entry to the disk cache, through a temporary file so readers never see half of it"""
+        if self.cacheDir is None:
+            return
+        path = self._diskPath(key)
+        tmpPath = "%s.%d.tmp" % (path, os.getpid())
+        with open(tmpPath, "wb") as fl:
+            pickle.dump((signature, data), fl, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpPath, path)
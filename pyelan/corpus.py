@@ -0,0 +1,67 @@
+import os, glob
+from . import pyelan
+from .parallel import runJobs, poolSize
+
+class corpusSet:
+    """A collection of tierSets loaded from many elan files, keyed by file, along with the errors for any files that could not be loaded"""
+    def __init__(self, tierSets=None, errors=None):
+        self.tierSets = tierSets if tierSets is not None else {}
+        self.errors = errors if errors is not None else {}
+
+    def __len__(self):
+        return len(self.tierSets)
+
+    def __iter__(self):
+        return iter(self.tierSets.items())
+
+    def __getitem__(self, file):
+        return self.tierSets[file]
+
+    def join(self, tierA, tierB, how="overlap"):
+        """A generator of (file, annotation from tierA, annotation from tierB) for every file in the corpus that has both tiers (see joinTiers)"""
+        for file, tierObj in self.tierSets.items():
+            tiers = {tr.tierName: tr for tr in tierObj.tiers}
+            if tierA in tiers and tierB in tiers:
+                for annoA, annoB in pyelan.joinTiers(tiers[tierA], tiers[tierB], how=how):
+                    yield file, annoA, annoB
+
+    def tableOut(self, dest):
+        """Writes the annotations of every file in the corpus to a binary, columnar table at dest (see pyelan.table.writeTable), returning the number of annotations written"""
+        from .table import writeTable
+        return writeTable(self.tierSets, dest)
+
+def _expandPaths(pathsOrGlob):
+    """Returns a list of paths from either a glob pattern or an iterable of paths"""
+    if isinstance(pathsOrGlob, (str, os.PathLike)):
+        return sorted(glob.glob(os.fspath(pathsOrGlob), recursive=True))
+    return [os.fspath(path) for path in pathsOrGlob]
+
+def _loadFile(file, tierNames, columnar):
+    """Loads one elan file"""
+    return pyelan.tierSet(file=file, columnar=columnar, tierNames=tierNames)
+
+def iterCorpus(pathsOrGlob, tiers=None, workers=None, columnar=False):
+    """
+    A generator that loads many elan files across workers processes (all cores if None), yielding (file, tierSet, error) in the order the files finish.
+    Only the tiers named in tiers are kept (all of them if None). Workers always send columnarTiers back, which are compact to send between processes; unless columnar is True they are turned back into regular (editable) tiers here.
+    Files that fail give None for the tierSet and the traceback as the error, rather than raising.
+    """
+    paths = _expandPaths(pathsOrGlob)
+    tierNames = set(tiers) if tiers is not None else None
+    sent = columnar or poolSize(workers, len(paths)) > 1
+    for (path, _, _), tierObj, error, _ in runJobs(_loadFile, [(path, tierNames, sent) for path in paths], workers):
+        if tierObj is not None and sent and not columnar:
+            tierObj.tiers = [tr.toTier() for tr in tierObj.tiers]
+        yield path, tierObj, error
+
+def loadCorpus(pathsOrGlob, tiers=None, workers=None, columnar=False):
+    """Loads many elan files in parallel (see iterCorpus) into a corpusSet, keeping the files in the order they were given"""
+    paths = _expandPaths(pathsOrGlob)
+    results = {}
+    errors = {}
+    for file, tierObj, error in iterCorpus(paths, tiers=tiers, workers=workers, columnar=columnar):
+        if error is None:
+            results[file] = tierObj
+        else:
+            errors[file] = error
+    return corpusSet({path: results[path] for path in paths if path in results}, {path: errors[path] for path in paths if path in errors})
@@ -1,41 +1,96 @@
-import sys, re, os, csv, json
-import pyelan as pyelan
+import sys, os, csv, json, argparse
+from . import pyelan
+from .parallel import runJobs
 
-# python elanGen.py "elanFiles" "GRI_006-SESSION_001-TRIAL_002" "[./clippedData/GRI_006-SESSION_001-TRIAL_002.mov]"  '[{"file" : "./savedData/GRI_006/GRI_006-SESSION_001-TRIAL_002.csv", "tracks" : [{"name": "clapper", "column": 36, "min":0, "max":200}, {"name": "grip", "column": 35, "min":0, "max":200}]}]'
+# python -m pyelan.elanGen "elanFiles" "GRI_006-SESSION_001-TRIAL_002" "[./clippedData/GRI_006-SESSION_001-TRIAL_002.mov]"  '[{"file" : "./savedData/GRI_006/GRI_006-SESSION_001-TRIAL_002.csv", "tracks" : [{"name": "clapper", "column": 36, "min":0, "max":200}, {"name": "grip", "column": 35, "min":0, "max":200}]}]'
+# min and max can be left out of a track (or "detectRanges": true added to a csv) to compute the ranges from the csv
+#
+# or, for many sessions at once:
+# python -m pyelan.elanGen --manifest sessions.jsonl --workers 8
+# where each line of sessions.jsonl is {"saveDir": ..., "basename": ..., "media": [...], "csvs": [...]} (with the same media and csvs as above).
+# A csv manifest with saveDir, basename, media, and csvs columns (media and csvs json encoded) works too.
 
-saveDir = sys.argv[1]
-basename = sys.argv[2]
-media = json.loads(sys.argv[3])
-csvsToLink = json.loads(sys.argv[4])
+def generateSession(saveDir, basename, media, csvsToLink):
+    """Writes a tsconf for each csv, one pfsx with the tracks of all of the csvs, and an eaf linking the media and the csvs, returning the path of the eaf"""
+    filesToLink = []
+    pfsxs = []
+    for csvToLink in csvsToLink:
+        csvFile = csvToLink["file"]
+        filesToLink.append(csvFile)
+        # generate a new:
+        tracks = []
+        for track in csvToLink["tracks"]:
+            tracks.append(pyelan.track(name=track["name"], column=track["column"], row=0, range=[track.get("min"),track.get("max")], properties={"detect-range": "true"}))
+        linkedfile = pyelan.timeSeries(source=csvFile, sampleType="Continuous Rate", timeCol=0, tracks=tracks)
+        # compute the ranges in one pass over the csv (instead of ELAN detecting them every time the file is opened) if asked to, or if any are missing
+        if csvToLink.get("detectRanges") or any(track.range[0] is None or track.range[1] is None for track in tracks):
+            linkedfile.detectRanges()
+        out, pfsx = pyelan.timeSeries.timeSeriesOut(linkedfile)
 
-filesToLink = []
-for csv in csvsToLink:
-    csvFile = csv["file"]
-    filesToLink.append(csvFile)
-    # generate a new:
-    tracks = []
-    for track in csv["tracks"]:
-        tracks.append(pyelan.track(name=track["name"], column=track["column"], row=0, range=[track["min"],track["max"]], properties={"detect-range": "true"}))
-    linkedfile = pyelan.timeSeries(source=csvFile, sampleType="Continuous Rate", timeCol=0, tracks=tracks)
-    out, pfsx = pyelan.timeSeries.timeSeriesOut(linkedfile)
+        csvBasename = os.path.splitext(os.path.basename(csvFile))[0]
 
-    csvBasename = os.path.splitext(os.path.basename(csvFile))[0]
+        xmlOut = os.path.join(saveDir,'.'.join(['_'.join([csvBasename,"tsconf"]),"xml"]))
+        out.write(xmlOut)
+        filesToLink.append(xmlOut)
+        pfsxs.append(pfsx)
 
-    xmlOut = os.path.join(saveDir,'.'.join(['_'.join([csvBasename,"tsconf"]),"xml"]))
-    out.write(xmlOut)
-    filesToLink.append(xmlOut)
+    # one pfsx for the session, with the tracks from every csv
+    pfsxfile =  pyelan.pfsxOut(pfsxs)
+    pfsxOut = os.path.join(saveDir,'.'.join([basename,"pfsx"]))
+    pfsxfile.write(pfsxOut)
 
+    allTiers = pyelan.tierSet(media=media, linkedFiles=filesToLink, tiers=[pyelan.tier("default", [pyelan.annotation(begin=1, end=2, value="foo")])])
 
-    pfsxfile =  pyelan.pfsxOut([pfsx])
-    pfsxOut = os.path.join(saveDir,'.'.join([basename,"pfsx"]))
+    elanOut = os.path.join(saveDir,'.'.join([basename,"eaf"]))
 
-    pfsxfile.write(pfsxOut)
+    pyelan.tierSet.writeElan(allTiers, dest=elanOut)
+    return elanOut
+
+def readManifest(manifest):
+    """Reads the sessions in a jsonl (or, if it ends in .csv, csv) manifest"""
+    sessions = []
+    with open(manifest, newline="") as fl:
+        if manifest.endswith(".csv"):
+            for row in csv.DictReader(fl):
+                sessions.append({"saveDir": row["saveDir"], "basename": row["basename"], "media": json.loads(row["media"]), "csvs": json.loads(row["csvs"])})
+        else:
+            for line in fl:
+                if line.strip():
+                    sessions.append(json.loads(line))
+    return sessions
+
+def _generate(session):
+    """Generates one session from the manifest"""
+    os.makedirs(session["saveDir"], exist_ok=True)
+    return generateSession(session["saveDir"], session["basename"], session["media"], session["csvs"])
 
+def generateSessions(sessions, workers=None):
+    """Generates many sessions in one interpreter, across workers processes (all cores if None), yielding (basename, seconds, error) as each finishes"""
+    for (session,), _, error, seconds in runJobs(_generate, [(session,) for session in sessions], workers):
+        yield session.get("basename"), seconds, error
 
-allTiers = pyelan.tierSet(media=media, linkedFiles=filesToLink, tiers=[pyelan.tier("default", [pyelan.annotation(begin=1, end=2, value="foo")])])
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate eaf, tsconf, and pfsx files for a session (or many sessions from a manifest).")
+    parser.add_argument("session", nargs="*", help="saveDir basename media csvs (media and csvs json encoded)")
+    parser.add_argument("--manifest", help="a jsonl or csv file of sessions to generate")
+    parser.add_argument("--workers", type=int, default=None, help="the number of processes to use with --manifest (default: all cores)")
+    args = parser.parse_args(argv)
 
-elanOut = os.path.join(saveDir,'.'.join([basename,"eaf"]))
+    if args.manifest:
+        failed = 0
+        for basename, seconds, error in generateSessions(readManifest(args.manifest), workers=args.workers):
+            if error is None:
+                print("generated %s (%.3fs)" % (basename, seconds))
+            else:
+                failed += 1
+                print("failed %s (%.3fs)\n%s" % (basename, seconds, error), file=sys.stderr)
+        return 1 if failed else 0
 
-out = pyelan.tierSet.elanOut(allTiers, dest=elanOut)
+    if len(args.session) != 4:
+        parser.error("expected saveDir basename media csvs, or --manifest")
+    saveDir, basename, media, csvsToLink = args.session
+    generateSession(saveDir, basename, json.loads(media), json.loads(csvsToLink))
+    return 0
 
-out.write(elanOut)
+if __name__ == "__main__":
+    sys.exit(main())
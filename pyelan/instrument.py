@@ -0,0 +1,107 @@
+"""
+Lightweight instrumentation for pyelan's hot paths: timing spans (parsing, time slot resolution, file walking, lcs scoring, xml serialization) and counters (annotations built, files walked, lcs scores).
+It is off by default, and when off a span is a shared no-op and counters are skipped, so it costs (next to) nothing.
+
+    from pyelan import instrument
+    instrument.enable(instrument.logHandler())   # or enable(callback) with your own callback
+    ...
+    instrument.stats()                           # totals since enable() or reset()
+"""
+import time, functools
+
+enabled = False
+_handlers = []
+_timings = {}
+_counters = {}
+
+def enable(handler=None):
+    """Turns instrumentation on, optionally adding a handler that is called as handler(kind, name, value, info) for every span ("span", seconds) and counter ("count", n)"""
+    global enabled
+    if handler is not None:
+        _handlers.append(handler)
+    enabled = True
+
+def disable():
+    """Turns instrumentation off and removes all handlers"""
+    global enabled
+    enabled = False
+    del _handlers[:]
+
+def logHandler(logger=None, level=10):
+    """Returns a handler that reports spans and counters to a logging logger (pyelan by default) at level (logging.DEBUG by default)"""
+    import logging
+    logger = logger or logging.getLogger("pyelan")
+    def handler(kind, name, value, info):
+        if kind == "span":
+            logger.log(level, "%s took %.6fs %s", name, value, info)
+        else:
+            logger.log(level, "%s +%d %s", name, value, info)
+    return handler
+
+def stats():
+    """Returns the total seconds and calls for each span and the total of each counter"""
+    return {"timings": {name: dict(timing) for name, timing in _timings.items()}, "counters": dict(_counters)}
+
+def reset():
+    """Clears the totals returned by stats"""
+    _timings.clear()
+    _counters.clear()
+
+def _emit(kind, name, value, info):
+    for handler in _handlers:
+        handler(kind, name, value, info)
+
+def count(name, n=1, **info):
+    """Adds n to a counter (when instrumentation is on)"""
+    if not enabled:
+        return
+    _counters[name] = _counters.get(name, 0) + n
+    _emit("count", name, n, info)
+
+class _span:
+    __slots__ = ('name', 'info', 'start')
+
+    def __init__(self, name, info):
+        self.name = name
+        self.info = info
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        timing = _timings.setdefault(self.name, {"seconds": 0., "calls": 0})
+        timing["seconds"] += seconds
+        timing["calls"] += 1
+        _emit("span", self.name, seconds, self.info)
+        return False
+
+class _noSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NOSPAN = _noSpan()
+
+def span(name, **info):
+    """A context manager that times the code in it (when instrumentation is on)"""
+    if not enabled:
+        return _NOSPAN
+    return _span(name, info)
+
+def timed(name):
+    """A decorator that times every call to a function as a span called name (when instrumentation is on)"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            with _span(name, {}):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
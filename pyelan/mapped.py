@@ -0,0 +1,34 @@
+import os, mmap
+
+class mappedFiles:
+    """
+    Read only memory maps of the binary files in a directory (e.g. the columns of a sample cache or an annotation table), each mapped when it is first asked for.
+    Views handed out keep their map alive, so they stay valid after close() and even after the files are removed.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self._maps = {}
+
+    def get(self, fileName):
+        """Returns the map of a file (empty bytes for an empty file, which can't be mapped)"""
+        if fileName not in self._maps:
+            with open(os.path.join(self.directory, fileName), "rb") as fl:
+                if os.fstat(fl.fileno()).st_size == 0:
+                    self._maps[fileName] = b""
+                else:
+                    self._maps[fileName] = mmap.mmap(fl.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._maps[fileName]
+
+    def view(self, fileName, code):
+        """Returns a new view of a file as a sequence of numbers of an array type code"""
+        return memoryview(self.get(fileName)).cast(code)
+
+    def close(self):
+        """Closes the maps, which are mapped again when next asked for. Maps that views still point to can't be closed, and are left for the garbage collector."""
+        for mapped in self._maps.values():
+            if isinstance(mapped, mmap.mmap):
+                try:
+                    mapped.close()
+                except BufferError:
+                    pass
+        self._maps = {}
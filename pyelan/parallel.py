@@ -0,0 +1,37 @@
+import os, time, traceback
+# concurrent.futures is only imported when a pool is actually used
+
+def poolSize(workers, nJobs):
+    """Returns the number of processes runJobs uses for nJobs jobs: workers (all cores if None), or 1 (run here, without a pool) if there are fewer than two jobs"""
+    if workers is None:
+        workers = os.cpu_count() or 1
+    return 1 if nJobs < 2 else workers
+
+def _call(func, job):
+    """Calls func(*job), returning (result, error, seconds) with the traceback as the error instead of raising"""
+    start = time.perf_counter()
+    try:
+        result = func(*job)
+    except Exception:
+        return None, traceback.format_exc(), time.perf_counter() - start
+    return result, None, time.perf_counter() - start
+
+def runJobs(func, jobs, workers=None, initializer=None, initargs=()):
+    """
+    A generator that calls func(*job) for every job (a tuple of arguments) across a pool of poolSize(workers, len(jobs)) processes, or one after another in this process if that is 1, yielding (job, result, error, seconds) in the order the jobs finish.
+    A job that raises gives None as its result and the traceback as its error, rather than stopping the others.
+    initializer(*initargs) is run once in each worker (or once here), e.g. to share a large argument between every job without sending it with each of them.
+    """
+    jobs = list(jobs)
+    size = poolSize(workers, len(jobs))
+    if size == 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for job in jobs:
+            yield (job,) + _call(func, job)
+        return
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    with ProcessPoolExecutor(max_workers=size, initializer=initializer, initargs=initargs) as pool:
+        futures = {pool.submit(_call, func, job): job for job in jobs}
+        for future in as_completed(futures):
+            yield (futures[future],) + future.result()
@@ -1,13 +1,9 @@
-import sys, os, re, datetime, warnings
-from importlib import resources as impresources
-from . import templates
+import sys, os, re, warnings, bisect, array, copy
+from . import instrument
 from xml.etree import ElementTree
+from xml.parsers import expat
 
-#import tk if it exists. This import might not actually be necesary in pyelan anymore (it might be legacy from fflipper)
-try:
-    import tkMessageBox
-except ImportError:
-    pass
+# datetime, json, tempfile, shutil, concurrent.futures, importlib.resources, and the sample cache are imported where they are used, so that importing pyelan stays fast
 
 class Error(Exception):
     """Base class for exceptions in this module."""
@@ -51,44 +47,463 @@ def getRecDirStruct(rootdir):
     return dir
 
 def lcs(string1, string2):
+    """The length of the longest common subsequence of two strings, using two rows of the dynamic programming table (O(min(m, n)) memory)"""
     # from http://stackoverflow.com/questions/5267610/comparing-strings
-    m = len(string1)
+    if len(string2) > len(string1):
+        string1, string2 = string2, string1
     n = len(string2)
 
-    C = [[0] * (n + 1)] * (m + 1)
-    for i in range(m + 1)[1:]:
-        for j in range(n + 1)[1:]:
-            if string1[i - 1] == string2[j - 1]:
-                C[i][j] = C[i - 1][j - 1] + 1
+    previous = [0] * (n + 1)
+    current = [0] * (n + 1)
+    for char1 in string1:
+        for j in range(1, n + 1):
+            if char1 == string2[j - 1]:
+                current[j] = previous[j - 1] + 1
             else:
-                C[i][j] = max(C[i][j - 1], C[i - 1][j])
-    return C[m][n]
-
-def findPathMatch(oldPath, searchDir = "./"):
-    dirContents = getRecDirStruct(searchDir)
-    # print(dirContents)
-    if os.path.isfile(oldPath) == False:
-        # if the current path is not a valid path
-        basename = os.path.basename(oldPath)
+                current[j] = max(current[j - 1], previous[j])
+        previous, current = current, previous
+    return previous[n]
+
+def _pathComponents(path):
+    """Splits a path into its directory components"""
+    return [part for part in os.path.normpath(path).split(os.sep) if part not in ("", ".")]
+
+def suffixScore(oldPath, newPath):
+    """Scores how well newPath matches oldPath by the number of directory components they share at the end (closest to the file), and then by the number of components they share anywhere"""
+    oldParts = _pathComponents(os.path.dirname(oldPath))
+    newParts = _pathComponents(os.path.dirname(newPath))
+    suffix = 0
+    for oldPart, newPart in zip(reversed(oldParts), reversed(newParts)):
+        if oldPart != newPart:
+            break
+        suffix += 1
+    return suffix, len(set(oldParts) & set(newParts))
+
+class dirIndex:
+    """
+    An index of every file under a search directory, keyed by basename, built with a single walk so that many links can be matched against it.
+    If cacheFile is given the index is saved there and reused as long as none of the directories' modification times have changed.
+    """
+    def __init__(self, searchDir="./", cacheFile=None):
+        self.searchDir = os.path.abspath(searchDir)
+        self.cacheFile = cacheFile
+        self.paths = {}
+        self.dirMtimes = {}
+        if cacheFile is None or not self.loadCache():
+            self.walk()
+            if cacheFile is not None:
+                self.saveCache()
+
+    @instrument.timed("walk")
+    def walk(self):
+        """(Re)builds the index by walking the search directory"""
+        paths = {}
+        dirMtimes = {}
+        for path, dirs, files in os.walk(self.searchDir):
+            dirMtimes[path] = os.stat(path).st_mtime_ns
+            for file in files:
+                paths.setdefault(file, []).append(os.path.join(path, file))
+        self.paths = paths
+        self.dirMtimes = dirMtimes
+        instrument.count("filesWalked", sum(len(found) for found in paths.values()))
+        return self
 
-        # filter all of the files in the current directory that match the filename
-        newPaths = filter(lambda s: re.match(os.path.sep.join((".*",basename)), s), dirContents)
+    def isStale(self):
+        """Checks if any directory in the index has been changed (or removed) since it was built"""
+        for path, mtime in self.dirMtimes.items():
+            try:
+                if os.stat(path).st_mtime_ns != mtime:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def loadCache(self):
+        """Loads the index from cacheFile, returning False if there is no cache or it is out of date"""
+        import json
+        try:
+            with open(self.cacheFile) as fl:
+                cache = json.load(fl)
+        except (OSError, ValueError):
+            return False
+        if cache.get("searchDir") != self.searchDir:
+            return False
+        self.paths = cache["paths"]
+        self.dirMtimes = cache["dirMtimes"]
+        if self.isStale():
+            self.paths = {}
+            self.dirMtimes = {}
+            return False
+        return True
+
+    def saveCache(self):
+        """Saves the index to cacheFile"""
+        import json
+        cacheDir = os.path.dirname(os.path.abspath(self.cacheFile))
+        for rewrite in (False, True):
+            with open(self.cacheFile, "w") as fl:
+                json.dump({"searchDir": self.searchDir, "paths": self.paths, "dirMtimes": self.dirMtimes}, fl)
+            # creating the cache inside the search directory changes that directory's mtime, record the new one so the cache is not immediately stale
+            if rewrite or cacheDir not in self.dirMtimes or os.stat(cacheDir).st_mtime_ns == self.dirMtimes[cacheDir]:
+                break
+            self.dirMtimes[cacheDir] = os.stat(cacheDir).st_mtime_ns
+
+    def matches(self, basename):
+        """Returns every path in the index with the given basename"""
+        return self.paths.get(basename, [])
+
+    def findPathMatch(self, oldPath):
+        """Finds the best match in the index for a path that no longer exists (paths that exist are returned as is)"""
+        if os.path.isfile(oldPath):
+            return oldPath
+        basename = os.path.basename(oldPath)
+        newPaths = self.matches(basename)
         if len(newPaths) == 1:
             # if only one is found, make that the new path
             newPath = newPaths[0]
         elif len(newPaths) > 1:
-            # determine which path matches more of the directory structure. This uses common strings, but not common contiguous strings. This should work in nearly all conditions, but there migth be edge cases where this fails.
-            scores = [lcs(oldPath,pt) for pt in newPaths]
-            newPath = newPaths[scores.index(max(scores))]
-        elif len(newPaths) == 0:
+            # determine which path shares more of the directory structure, closest to the file first.
+            scores = [suffixScore(oldPath, pt) for pt in newPaths]
+            best = max(scores)
+            tied = sorted(pt for pt, score in zip(newPaths, scores) if score == best)
+            if len(tied) > 1:
+                # only fall back on common (not necessarily contiguous) characters to break ties
+                with instrument.span("lcs"):
+                    lcsScores = [lcs(oldPath, pt) for pt in tied]
+                instrument.count("lcsScores", len(tied))
+                newPath = tied[lcsScores.index(max(lcsScores))]
+            else:
+                newPath = tied[0]
+        else:
             warnings.warn("Could not find any linked files for " + basename)
             newPath = oldPath
-    else:
-        newPath = oldPath
-    return newPath
+        return newPath
+
+def findPathMatch(oldPath, searchDir = "./", index = None):
+    """Finds the best match for oldPath in searchDir. Pass a dirIndex as index to reuse one walk of the search directory across many paths."""
+    if index is None:
+        if os.path.isfile(oldPath):
+            return oldPath
+        index = dirIndex(searchDir)
+    return index.findPathMatch(oldPath)
+
+def _fixPaths(paths, index, changes):
+    """Returns the best matches in index for a list of paths, recording any that changed in changes"""
+    if paths is None:
+        return None
+    newPaths = []
+    for path in paths:
+        newPath = os.path.abspath(index.findPathMatch(path))
+        if newPath != path:
+            changes.append((path, newPath))
+        newPaths.append(newPath)
+    return newPaths
+
+@instrument.timed("write")
+def writeAtomic(tree, dest):
+    """Writes an ElementTree to dest through a temporary file in the same directory that is renamed into place, so dest is never left half written"""
+    import tempfile, shutil
+    destDir = os.path.dirname(os.path.abspath(dest))
+    fd, tmpPath = tempfile.mkstemp(dir=destDir, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fl:
+            tree.write(fl)
+        # mkstemp files are private, give the new file the permissions of the one it replaces
+        if os.path.exists(dest):
+            shutil.copymode(dest, tmpPath)
+        else:
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(tmpPath, 0o666 & ~umask)
+        os.replace(tmpPath, dest)
+    except BaseException:
+        os.unlink(tmpPath)
+        raise
+
+def _defaultSkeleton(headFootFile=None):
+    """Returns headFootFile, or the skeleton elan file shipped with pyelan if it is None"""
+    if headFootFile is None:
+        from importlib import resources
+        from . import templates
+        headFootFile = resources.files(templates) / "elanSkeleton.eaf"
+    return headFootFile
+
+_skeletons = {}
+
+def _parsedSkeleton(headFootFile):
+    """Parses a skeleton elan file once per process"""
+    key = str(headFootFile)
+    if key not in _skeletons:
+        _skeletons[key] = ElementTree.parse(headFootFile).getroot()
+    return _skeletons[key]
+
+def _skeleton(headFootFile):
+    """Returns a fresh copy of the root of a skeleton elan file"""
+    return copy.deepcopy(_parsedSkeleton(headFootFile))
+
+_skeletonParts = {}
+
+def _skeletonSplit(headFootFile):
+    """
+    Serializes a skeleton elan file once per process, split into the text that goes before the header descriptors, before the time slots, before the tiers, and after the tiers.
+    This matches how ElementTree writes the skeleton once descriptors, time slots, and tiers have been appended to it.
+    """
+    key = str(headFootFile)
+    if key not in _skeletonParts:
+        root = _skeleton(headFootFile)
+        marker = "pyelan-split-%d" % id(root)
+        root.findall('HEADER')[0].append(ElementTree.Comment(marker))
+        root[1].append(ElementTree.Comment(marker))
+        root.append(ElementTree.Comment(marker))
+        _skeletonParts[key] = ElementTree.tostring(root, encoding="unicode").split("<!--%s-->" % marker)
+    return _skeletonParts[key]
+
+def _sharedTimeSlots(tiers):
+    """Returns a dictionary of every distinct time in the tiers (in sorted order) to a short time slot id"""
+    times = set()
+    for tr in tiers:
+        for anno in tr.annotations:
+            times.add(anno.begin)
+            times.add(anno.end)
+    return {time: 'ts' + str(n) for n, time in enumerate(sorted(times), 1)}
+
+def _addTimeSlots(time_order, workingTier, tslt, anno):
+    """Adds a time slot for the beginning and end of an annotation, returning their ids"""
+    ids = []
+    for n, time_value in enumerate((anno.begin, anno.end), 1):
+        time_slot_id = 'ts' + workingTier + str(tslt + n)
+        time_slot = ElementTree.SubElement(time_order, "TIME_SLOT")
+        time_slot.attrib["TIME_SLOT_ID"] = time_slot_id
+        time_slot.attrib["TIME_VALUE"] = str(time_value)
+        ids.append(time_slot_id)
+    return ids
+
+def _headerDescriptors(tierObj, destDir):
+    """Builds the media and linked file descriptor elements for the header of an elan file"""
+    descriptors = []
+    for mediaFile in tierObj.media or []:
+        media = ElementTree.Element('MEDIA_DESCRIPTOR')
+        media.set('MEDIA_URL', ''.join(["file://",os.path.abspath(mediaFile)]))
+        if os.path.splitext(mediaFile)[1] == ".wav":
+            media.set('MIME_TYPE', 'audio/*')
+        else:
+            media.set('MIME_TYPE', 'video/*')
+        media.set('RELATIVE_MEDIA_URL', ''.join(["./",os.path.relpath(os.path.abspath(mediaFile), destDir)]))
+        descriptors.append(media)
+
+    # Set the link
+    linkedFiles = tierObj.linkedFiles
+    if linkedFiles is not None and linkedFiles != [None]:
+        for fl in linkedFiles:
+            media = ElementTree.Element('LINKED_FILE_DESCRIPTOR')
+            media.set('LINK_URL', ''.join(["file://",os.path.abspath(fl)]))
+            media.set('MIME_TYPE', 'unknown') # change to read file extension?
+            media.set('RELATIVE_LINK_URL', ''.join(["./",os.path.relpath(os.path.abspath(fl), destDir)]))
+            descriptors.append(media)
+    return descriptors
+
+# ElementTree's own escaping, so that streamed output matches what ElementTree writes
+def _escapeText(value):
+    """Escapes text the way ElementTree writes element text"""
+    if "&" in value:
+        value = value.replace("&", "&amp;")
+    if "<" in value:
+        value = value.replace("<", "&lt;")
+    if ">" in value:
+        value = value.replace(">", "&gt;")
+    return value
+
+def _escapeAttrib(value):
+    """Escapes an attribute value the way ElementTree writes attributes (quotes and whitespace other than spaces become character references)"""
+    value = _escapeText(value)
+    if '"' in value:
+        value = value.replace('"', "&quot;")
+    if "\r" in value:
+        value = value.replace("\r", "&#13;")
+    if "\n" in value:
+        value = value.replace("\n", "&#10;")
+    if "\t" in value:
+        value = value.replace("\t", "&#09;")
+    return value
+
+def _writeClip(clip, dest, sharedTimeSlots):
+    """Writes one clip from tierSet.segment (in a worker process)"""
+    tierSet.writeElan(clip, dest=dest, sharedTimeSlots=sharedTimeSlots)
+
+def _headerPaths(descriptors, urlAttrib, relUrlAttrib):
+    """Returns the absolute and relative paths from a list of media or linked file descriptors (their attributes, as dictionaries), or None if there are none"""
+    if len(descriptors) == 0:
+        return None, None
+    paths = []
+    relPaths = []
+    for descriptor in descriptors:
+        paths.append(descriptor[urlAttrib][7:]) # [7:] removes the file://
+        if relUrlAttrib in descriptor:
+            relPaths.append(descriptor[relUrlAttrib])
+    return paths, relPaths
+
+def _internValue(value):
+    """Interns annotation values so that repeated glosses share one string"""
+    if value is None:
+        return value
+    return sys.intern(value.strip())
+
+def _resolveTimeSlots(timeDict):
+    """
+    Fills in the unaligned slots (None) of a dictionary of time slot ids to times, in place, using the order of the TIME_ORDER (the order the dictionary was filled in).
+    Unaligned slots are placed proportionally between the aligned slots on either side of them, or take the time of the nearest aligned slot at either end.
+    """
+    slotIds = list(timeDict)
+    times = list(timeDict.values())
+    aligned = [i for i, time in enumerate(times) if time is not None]
+    if not aligned:
+        return timeDict
+    for i in range(0, aligned[0]):
+        timeDict[slotIds[i]] = times[aligned[0]]
+    for i in range(aligned[-1] + 1, len(times)):
+        timeDict[slotIds[i]] = times[aligned[-1]]
+    for lo, hi in zip(aligned, aligned[1:]):
+        for i in range(lo + 1, hi):
+            timeDict[slotIds[i]] = times[lo] + (times[hi] - times[lo]) * (i - lo) // (hi - lo)
+    return timeDict
+
+# the start tag of a tier (attribute values can't contain < but can contain >)
+_tierStart = re.compile(rb'<TIER(?=[\s/>])(?:[^>"\']|"[^"]*"|\'[^\']*\')*>')
+
+def _iterElan(file, tierNames=None, header=None, window=None):
+    """
+    Streams an elan file (a path or a binary file object) with expat, yielding (tierName, None) at the start of each tier and then (tierName, annotation) for each of its annotations.
+    No element tree is built, so memory does not grow with the number of annotations, but it does with the TIME_ORDER: every time slot is kept (as one id to time entry) until the file is done.
+    Tiers not in tierNames are skipped wholesale: the bytes up to their end tag are never given to the parser, so load time drops roughly in proportion to the tiers skipped (the header and TIME_ORDER are always read). Files in an encoding that is not ascii compatible (e.g. utf-16) are read in full.
+    If window is a (begin, end) pair, only annotations contained in it are built.
+    If a dictionary is given as header it is filled with the media and linked file paths.
+    """
+    if tierNames is not None:
+        tierNames = set(tierNames)
+    if window is not None:
+        windowBegin, windowEnd = window
+    timeDict = {}
+    descriptors = {"MEDIA_DESCRIPTOR": [], "LINKED_FILE_DESCRIPTOR": []}
+    pending = []
+    # the tier being read (and whether it is kept, and whether its bytes can be skipped), the time slot references of the current annotation, and the pieces of its value
+    current = {"unaligned": False, "tierName": None, "refs": None, "text": None, "keep": False, "skip": False}
+    parser = expat.ParserCreate()
+    parser.buffer_text = True
+
+    def text(data):
+        current["text"].append(data)
+
+    def start(name, attrib):
+        if name == "ALIGNABLE_ANNOTATION":
+            current["refs"] = (attrib['TIME_SLOT_REF1'], attrib['TIME_SLOT_REF2'])
+            current["text"] = None
+        elif name == "ANNOTATION_VALUE":
+            current["text"] = []
+            parser.CharacterDataHandler = text
+        elif name == "TIME_SLOT":
+            value = attrib.get('TIME_VALUE')
+            if value is None:
+                current["unaligned"] = True
+                timeDict[attrib['TIME_SLOT_ID']] = None
+            else:
+                timeDict[attrib['TIME_SLOT_ID']] = int(value)
+        elif name == "TIER":
+            current["tierName"] = attrib['TIER_ID']
+            current["keep"] = tierNames is None or current["tierName"] in tierNames
+            if current["keep"]:
+                pending.append((current["tierName"], None))
+            else:
+                current["skip"] = True
+        elif name in descriptors and header is not None:
+            descriptors[name].append(attrib)
+
+    def end(name):
+        if name == "ANNOTATION_VALUE":
+            parser.CharacterDataHandler = None
+        elif name == "ALIGNABLE_ANNOTATION" and current["keep"]:
+            time1 = timeDict[current["refs"][0]]
+            time2 = timeDict[current["refs"][1]]
+            if window is None or (time1 >= windowBegin and time2 <= windowEnd):
+                value = "".join(current["text"]) if current["text"] else None
+                pending.append((current["tierName"], annotation(time1, time2, value)))
+        elif name == "TIME_ORDER":
+            with instrument.span("timeSlots"):
+                if current["unaligned"]:
+                    _resolveTimeSlots(timeDict)
+            instrument.count("timeSlots", len(timeDict))
+        elif name == "HEADER" and header is not None:
+            header['media'], header['relMedia'] = _headerPaths(descriptors["MEDIA_DESCRIPTOR"], 'MEDIA_URL', 'RELATIVE_MEDIA_URL')
+            header['linkedFiles'], header['relLinkedFiles'] = _headerPaths(descriptors["LINKED_FILE_DESCRIPTOR"], 'LINK_URL', 'RELATIVE_LINK_URL')
+
+    def feed(data, final=False):
+        try:
+            parser.Parse(data, final)
+        except expat.ExpatError as err:
+            error = ElementTree.ParseError(str(err))
+            error.code, error.position = err.code, (err.lineno, err.offset)
+            raise error from None
+
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    if hasattr(parser, "SetReparseDeferralEnabled"):
+        # tier start tags have to be reported as soon as they are fed for skipping to work
+        parser.SetReparseDeferralEnabled(False)
+    fl = file if hasattr(file, "read") else open(file, "rb")
+    try:
+        buf = b""
+        eof = False
+        needMore = True
+        while True:
+            if needMore and not eof:
+                chunk = fl.read(65536)
+                eof = not chunk
+                buf += chunk
+            needMore = False
+            if current["skip"]:
+                # the tier's content never reaches the parser, only its end tag does
+                stop = buf.find(b"</TIER>")
+                if stop < 0:
+                    if eof:
+                        feed(buf, True)
+                        break
+                    buf = buf[-6:]
+                    needMore = True
+                    continue
+                buf = buf[stop:]
+                current["skip"] = False
+            match = _tierStart.search(buf)
+            if match:
+                # feed up to the end of the tier's start tag, so the parser decides whether it is skipped before seeing its content
+                feed(buf[:match.end()])
+                if match.group().endswith(b"/>"):
+                    current["skip"] = False
+                buf = buf[match.end():]
+            elif eof:
+                feed(buf, True)
+                break
+            else:
+                # keep anything from the last < in case it is the start of a tier tag that continues in the next chunk
+                cut = buf.rfind(b"<")
+                if cut < 0:
+                    cut = len(buf)
+                feed(buf[:cut])
+                buf = buf[cut:]
+                needMore = True
+                # a tier tag the pattern did not find (a file not in an ascii compatible encoding) is read normally
+                current["skip"] = False
+            if pending:
+                yield from pending
+                del pending[:]
+        if pending:
+            yield from pending
+    finally:
+        if fl is not file:
+            fl.close()
 
 class annotation:
     """A single annotation that has a beginning, an ending, an annotation value, and a unit type (default is milliseconds"""
+    __slots__ = ('begin', 'end', 'value', 'units')
+
     def __init__(self, begin, end, value, units="ms"):
         self.begin = begin
         self.end = end
@@ -115,17 +530,298 @@ class annotation:
         self.units = "ms"
         return self
 
+def _millisToFrames(begins, ends, fps):
+    """Converts columns of begins and ends from milliseconds into frames, with the same rounding as annotation.millisToFrames"""
+    secsPerFrame = 1000./fps
+    return [int(float(begin)/secsPerFrame) for begin in begins], [int(float(end)/secsPerFrame) for end in ends]
+
+def _framesToMillis(begins, ends, fps):
+    """Converts columns of begins and ends from frames into milliseconds, with the same rounding as annotation.framesToMillis"""
+    secsPerFrame = 1000./fps
+    # +1 to align with the next frame, not the last one.
+    return [int(float(begin)*secsPerFrame+1) for begin in begins], [int(float(end)*secsPerFrame+secsPerFrame) for end in ends]
+
+class timeIndex:
+    """A sorted index over the begins and ends of a tier, for logarithmic time range lookups"""
+    def __init__(self, begins, ends):
+        # positions in the tier, sorted by the beginning of each annotation
+        self.order = sorted(range(len(begins)), key=begins.__getitem__)
+        self.begins = [begins[i] for i in self.order]
+        self.ends = ends
+        self.maxDuration = max([end - begin for begin, end in zip(begins, ends)], default=0)
+
+    def __len__(self):
+        return len(self.order)
+
+    def query(self, begin, end, overlap=False):
+        """Returns the positions (in tier order) of annotations that are contained in begin-end, or that overlap it if overlap is True"""
+        ends = self.ends
+        if overlap:
+            # nothing that starts before begin-maxDuration can reach into the window
+            lo = bisect.bisect_right(self.begins, begin - self.maxDuration)
+            hi = bisect.bisect_left(self.begins, end)
+            hits = [i for i in self.order[lo:hi] if ends[i] > begin]
+        else:
+            lo = bisect.bisect_left(self.begins, begin)
+            hi = bisect.bisect_right(self.begins, end)
+            hits = [i for i in self.order[lo:hi] if ends[i] <= end]
+        hits.sort()
+        return hits
+
+    def sweep(self, windows, overlap=False):
+        """
+        Finds the annotations for many (begin, end) windows in one sorted sweep, returning a list with the positions (in tier order) for each window.
+        Windows are visited in order of their beginning, so the start of the search only ever moves forward through the annotations.
+        """
+        begins = self.begins
+        order = self.order
+        ends = self.ends
+        n = len(begins)
+        results = [None] * len(windows)
+        lo = 0
+        for w in sorted(range(len(windows)), key=lambda w: windows[w][0]):
+            begin, end = windows[w][0], windows[w][1]
+            hits = []
+            if overlap:
+                # nothing that starts before begin-maxDuration can reach into the window
+                start = begin - self.maxDuration
+                while lo < n and begins[lo] <= start:
+                    lo += 1
+                j = lo
+                while j < n and begins[j] < end:
+                    if ends[order[j]] > begin:
+                        hits.append(order[j])
+                    j += 1
+            else:
+                while lo < n and begins[lo] < begin:
+                    lo += 1
+                j = lo
+                while j < n and begins[j] <= end:
+                    if ends[order[j]] <= end:
+                        hits.append(order[j])
+                    j += 1
+            hits.sort()
+            results[w] = hits
+        return results
+
 class tier:
     """A whole tier from ELAN consisting of a tier name as well as the annotations associated with it."""
     def __init__(self, tierName, annotations):
         self.tierName = tierName
         self.annotations = annotations
+        self._index = None
+        self._indexed = None
+
+    def timeIndex(self):
+        """Returns the time index for the tier, rebuilding it if the annotations have been replaced or resized since it was built (call reindex after editing annotations in place)"""
+        annos = self.annotations
+        if self._index is None or self._indexed is not annos or len(self._index) != len(annos):
+            self._index = timeIndex([anno.begin for anno in annos], [anno.end for anno in annos])
+            self._indexed = annos
+        return self._index
+
+    def reindex(self):
+        """Drops the time index so it is rebuilt on the next lookup. Needed after changing the times of individual annotations in place (e.g. anno.millisToFrames(), or assigning to tr.annotations[i]), which the index can't see."""
+        self._index = None
+        return self
+
+    def annotationsBetween(self, begin, end, overlap=False):
+        """Returns the annotations that are fully contained in begin-end, or any that overlap it if overlap is True"""
+        annos = self.annotations
+        return [annos[i] for i in self.timeIndex().query(begin, end, overlap=overlap)]
+
+    def millisToFrames(self, fps = (60.*(1000./1001.))):
+        """Converts every annotation in the tier (in milliseconds) into frames given a frame rate, in one pass"""
+        annos = self.annotations
+        begins, ends = _millisToFrames([anno.begin for anno in annos], [anno.end for anno in annos], fps)
+        for anno, begin, end in zip(annos, begins, ends):
+            anno.begin = begin
+            anno.end = end
+            anno.units = "frames"
+        self._index = None
+        return self
+
+    def framesToMillis(self, fps = (60.*(1000./1001.))):
+        """Converts every annotation in the tier (in frames) into milliseconds given a frame rate, in one pass"""
+        annos = self.annotations
+        begins, ends = _framesToMillis([anno.begin for anno in annos], [anno.end for anno in annos], fps)
+        for anno, begin, end in zip(annos, begins, ends):
+            anno.begin = begin
+            anno.end = end
+            anno.units = "ms"
+        self._index = None
+        return self
+
+class _annotationColumns:
+    """A read only sequence of annotations built on demand from the columns of a columnarTier"""
+    __slots__ = ('tier',)
+
+    def __init__(self, tier):
+        self.tier = tier
+
+    def __len__(self):
+        return len(self.tier.begins)
+
+    def __getitem__(self, i):
+        tr = self.tier
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return annotation(tr.begins[i], tr.ends[i], tr.values[i], tr.units)
+
+    def __iter__(self):
+        tr = self.tier
+        units = tr.units
+        for begin, end, value in zip(tr.begins, tr.ends, tr.values):
+            yield annotation(begin, end, value, units)
+
+class columnarTier(tier):
+    """
+    A tier that stores its annotations as columns: begins and ends in integer arrays, and interned values in a list, with a single unit type for the whole tier.
+    annotations gives a read only sequence of annotation objects built on demand, so code written for tier keeps working, while bulk operations work on the columns directly.
+    """
+    def __init__(self, tierName, begins=(), ends=(), values=(), units="ms"):
+        self.tierName = tierName
+        self.begins = array.array('q', begins)
+        self.ends = array.array('q', ends)
+        self.values = [_internValue(value) for value in values]
+        self.units = units
+        self._view = _annotationColumns(self)
+        self._index = None
+        self._indexed = None
+        if not len(self.begins) == len(self.ends) == len(self.values):
+            raise ValueError("begins, ends, and values must all be the same length")
+
+    @classmethod
+    def fromTier(cls, tr):
+        """Builds a columnar tier from a tier of annotation objects (the units are taken from the first annotation)"""
+        annos = tr.annotations
+        units = annos[0].units if len(annos) > 0 else "ms"
+        return cls(tr.tierName, [anno.begin for anno in annos], [anno.end for anno in annos], [anno.value for anno in annos], units)
+
+    def toTier(self):
+        """Returns a regular tier of annotation objects"""
+        return tier(self.tierName, list(self._view))
+
+    @property
+    def annotations(self):
+        return self._view
+
+    @annotations.setter
+    def annotations(self, annotations):
+        annotations = list(annotations)
+        self.begins = array.array('q', [anno.begin for anno in annotations])
+        self.ends = array.array('q', [anno.end for anno in annotations])
+        self.values = [_internValue(anno.value) for anno in annotations]
+        if len(annotations) > 0:
+            self.units = annotations[0].units
+        self._index = None
+
+    def append(self, anno):
+        """Adds an annotation to the end of the tier"""
+        self.begins.append(anno.begin)
+        self.ends.append(anno.end)
+        self.values.append(_internValue(anno.value))
+        self._index = None
+
+    def timeIndex(self):
+        """Returns the time index for the tier, rebuilding it if the columns have been replaced or resized since it was built (call reindex after editing them in place)"""
+        if self._index is None or self._indexed is not self.begins or len(self._index) != len(self.begins):
+            self._index = timeIndex(self.begins, self.ends)
+            self._indexed = self.begins
+        return self._index
+
+    def annotationsBetween(self, begin, end, overlap=False):
+        """Returns the annotations that are fully contained in begin-end, or any that overlap it if overlap is True"""
+        view = self._view
+        return [view[i] for i in self.timeIndex().query(begin, end, overlap=overlap)]
+
+    def take(self, positions):
+        """Returns a new columnar tier with only the annotations at positions"""
+        return columnarTier(self.tierName, [self.begins[i] for i in positions], [self.ends[i] for i in positions], [self.values[i] for i in positions], self.units)
+
+    def between(self, begin, end, overlap=False):
+        """Returns a new columnar tier with only the annotations that are contained in (or overlap) begin-end"""
+        return self.take(self.timeIndex().query(begin, end, overlap=overlap))
+
+    def filter(self, values):
+        """Returns a new columnar tier with only the annotations whose value is in values"""
+        values = set(values)
+        return self.take([i for i, value in enumerate(self.values) if value in values])
+
+    def shift(self, offset):
+        """Shifts every annotation in the tier by offset, in place"""
+        self.begins = array.array('q', [begin + offset for begin in self.begins])
+        self.ends = array.array('q', [end + offset for end in self.ends])
+        self._index = None
+        return self
+
+    def millisToFrames(self, fps = (60.*(1000./1001.))):
+        """Converts the whole tier (in milliseconds) into frames given a frame rate"""
+        begins, ends = _millisToFrames(self.begins, self.ends, fps)
+        self.begins = array.array('q', begins)
+        self.ends = array.array('q', ends)
+        self.units = "frames"
+        self._index = None
+        return self
+
+    def framesToMillis(self, fps = (60.*(1000./1001.))):
+        """Converts the whole tier (in frames) into milliseconds given a frame rate"""
+        begins, ends = _framesToMillis(self.begins, self.ends, fps)
+        self.begins = array.array('q', begins)
+        self.ends = array.array('q', ends)
+        self.units = "ms"
+        self._index = None
+        return self
+
+def joinTiers(trA, trB, how="overlap"):
+    """
+    Pairs up the annotations of two tiers by time, returning a list of (annotation from trA, annotation from trB) in the order of trA and then trB.
+    how is overlap (they share some time), contains (the trA annotation contains the trB one), within (the trA annotation is inside the trB one), or nearest (the trB annotation closest to each trA annotation, overlapping ones first, then the smallest gap, then the earliest).
+    Each tier is sorted once and swept against the other, rather than comparing every pair.
+    """
+    annosA = trA.annotations
+    annosB = trB.annotations
+    if how == "overlap" or how == "contains":
+        windows = [(anno.begin, anno.end) for anno in annosA]
+        hits = trB.timeIndex().sweep(windows, overlap=(how == "overlap"))
+        return [(annosA[i], annosB[j]) for i, found in enumerate(hits) for j in found]
+    elif how == "within":
+        windows = [(anno.begin, anno.end) for anno in annosB]
+        pairs = [(i, j) for j, found in enumerate(trA.timeIndex().sweep(windows)) for i in found]
+        pairs.sort()
+        return [(annosA[i], annosB[j]) for i, j in pairs]
+    elif how == "nearest":
+        if len(annosB) == 0:
+            return []
+        windows = [(anno.begin, anno.end) for anno in annosA]
+        overlapping = trB.timeIndex().sweep(windows, overlap=True)
+        index = trB.timeIndex()
+        byEnd = sorted(range(len(annosB)), key=lambda j: annosB[j].end)
+        ends = [annosB[j].end for j in byEnd]
+        pairs = []
+        for i, anno in enumerate(annosA):
+            if overlapping[i]:
+                pairs.append((anno, annosB[overlapping[i][0]]))
+                continue
+            candidates = []
+            before = bisect.bisect_right(ends, anno.begin) - 1
+            if before >= 0:
+                # the first annotation in tier order with the latest end before this one starts
+                first = bisect.bisect_left(ends, ends[before])
+                candidates.append((anno.begin - ends[before], min(byEnd[first:before + 1])))
+            after = bisect.bisect_left(index.begins, anno.end)
+            if after < len(index.begins):
+                last = bisect.bisect_right(index.begins, index.begins[after])
+                candidates.append((index.begins[after] - anno.end, min(index.order[after:last])))
+            pairs.append((anno, annosB[min(candidates)[1]]))
+        return pairs
+    raise ValueError("how must be one of overlap, contains, within, or nearest, not " + repr(how))
 
 class tierSet:
     """A Tier set either from a file, or from media, tiers, and a pathELAN"""
-    def __init__(self, file=None, media=[None], linkedFiles=[None], relLinkedFiles=[None], tiers=None, pathELAN=None):
+    def __init__(self, file=None, media=[None], linkedFiles=[None], relLinkedFiles=[None], tiers=None, pathELAN=None, columnar=False, tierNames=None, window=None):
         if file:
-            tiers,media,relMedia,linkedFiles,relLinkedFiles = self.extractTiers(file)
+            tiers,media,relMedia,linkedFiles,relLinkedFiles = self.extractTiers(file, columnar=columnar, tierNames=tierNames, window=window)
             pathELAN = os.path.dirname(file)
         self.media = media
         self.linkedFiles = linkedFiles
@@ -135,9 +831,9 @@ class tierSet:
 
         ### If media does not exist, try in the same folder as the elan file.:
         newMedia = []
-        for mediaFile in media:
+        for mediaFile in media or []:
             if os.path.isfile(mediaFile) == False:
-                sameDirPath = os.path.join(pathELAN,os.path.basename(mediaFile))
+                sameDirPath = os.path.join(pathELAN or "", os.path.basename(mediaFile))
                 if os.path.isfile(sameDirPath) == False:
                     # self.mediaFile = []
                     # self.tiers = tier
@@ -148,75 +844,93 @@ class tierSet:
                 else:
                     newMedia.append(sameDirPath)
 
-    def extractTiers(self, file):
-        """A function that extracts the tiers from a file and creates a tierSet that includes everything in the file."""
-        verbose = False
-        tree = ElementTree.parse(file)
-        root = tree.getroot()
-        rootLen = len(root)
-        pairs = [(X.attrib['TIME_SLOT_ID'],X.attrib['TIME_VALUE']) for X in root[1]]
-        timeDict = dict(pairs)
-        if verbose: print(timeDict)
+    def extractTiers(self, file, columnar=False, tierNames=None, window=None):
+        """
+        A function that extracts the tiers from a file and creates a tierSet that includes everything in the file. If columnar is True the tiers are columnarTiers.
+        tierNames and window (a (begin, end) pair) restrict which tiers and annotations are built while the file is parsed.
+        """
+        header = {}
         clipTiers = []
-        for tierFound in root.findall('TIER'):
-            if verbose: print(tierFound.attrib['TIER_ID'])
-            annos = []
-            for xx in tierFound:
-                time1 = timeDict[xx[0].attrib['TIME_SLOT_REF1']]
-                time2 = timeDict[xx[0].attrib['TIME_SLOT_REF2']]
-                value = xx[0][0].text
-                if verbose: print(value)
-                annos.append(annotation(int(time1), int(time2), value))
-            if verbose: print(annos)
-            clipTiers.append(tier(tierFound.attrib['TIER_ID'],annos))
-        if clipTiers == []:
-            print("No tier named 'Clips', please supply an eaf with one to segment on.")
-            exit
-        # Find the media file
-        # check? <HEADER MEDIA_FILE="" TIME_UNITS="milliseconds">
-        header = root.findall('HEADER')
-
-        # Find any media files
-        media = header[0].findall('MEDIA_DESCRIPTOR')
-        if len(media) > 0:
-            mediaPaths = []
-            relMediaFilePaths = []
-            for mediaFile in media:
-                mediaPaths.append(mediaFile.attrib['MEDIA_URL'][7:]) # [7:] removes the file://
-                if 'RELATIVE_MEDIA_URL' in mediaFile.attrib:
-                    relMediaFilePaths.append(mediaFile.attrib['RELATIVE_MEDIA_URL'])
-        else:
-            mediaPaths = None
-            relMediaFilePaths = None
-
-        # Find any linked files
-        linkedFiles = header[0].findall('LINKED_FILE_DESCRIPTOR')
-        if len(linkedFiles) > 0:
-            linkedFilePaths = []
-            relLinkedFilePaths = []
-            for linkedFile in linkedFiles:
-                linkedFilePaths.append(linkedFile.attrib['LINK_URL'][7:]) # [7:] removes the file://
-                if 'RELATIVE_LINK_URL' in linkedFile.attrib:
-                    relLinkedFilePaths.append(linkedFile.attrib['RELATIVE_LINK_URL'])
-        else:
-            linkedFilePaths = None
-            relLinkedFilePaths = None
-
-
-        return clipTiers,mediaPaths,relMediaFilePaths,linkedFilePaths,relLinkedFilePaths
-
-    def fixLinks(self, searchDir="./"):
-        """A function that fixes links in an elan file by searching recursively through the search directory, and then links the best matches for each file."""
-        self.media = [os.path.abspath(findPathMatch(path, searchDir=searchDir)) for path in self.media]
-        self.linkedFiles = [os.path.abspath(findPathMatch(path, searchDir=searchDir)) for path in self.linkedFiles]
-
-
+        nAnnotations = 0
+        with instrument.span("parse", file=str(file)):
+            for tierName, anno in _iterElan(file, tierNames=tierNames, header=header, window=window):
+                if anno is None:
+                    clipTiers.append(columnarTier(tierName) if columnar else tier(tierName, []))
+                elif columnar:
+                    clipTiers[-1].append(anno)
+                    nAnnotations += 1
+                else:
+                    clipTiers[-1].annotations.append(anno)
+                    nAnnotations += 1
+        instrument.count("annotations", nAnnotations)
+        if clipTiers == [] and tierNames is None:
+            warnings.warn("Could not find any tiers in: " + str(file))
+
+        return clipTiers,header['media'],header['relMedia'],header['linkedFiles'],header['relLinkedFiles']
+
+    @staticmethod
+    def iterTiers(file, tierNames=None):
+        """A generator that streams the tiers of an elan file one at a time, without holding the whole document in memory. Only tiers named in tierNames are built (all of them if tierNames is None)."""
+        currentTier = None
+        for tierName, anno in _iterElan(file, tierNames=tierNames):
+            if anno is None:
+                if currentTier is not None:
+                    yield currentTier
+                currentTier = tier(tierName, [])
+            else:
+                currentTier.annotations.append(anno)
+        if currentTier is not None:
+            yield currentTier
+
+    @staticmethod
+    def iterAnnotations(file, tierNames=None):
+        """A generator that streams (tierName, annotation) pairs from an elan file, freeing the parsed xml as it goes. Only tiers named in tierNames are built (all of them if tierNames is None)."""
+        for tierName, anno in _iterElan(file, tierNames=tierNames):
+            if anno is not None:
+                yield tierName, anno
+
+    def fixLinks(self, searchDir="./", index=None, dryRun=False):
+        """
+        A function that fixes links in an elan file by searching recursively through the search directory, and then links the best matches for each file. A dirIndex can be given as index to avoid walking the search directory again.
+        Returns a list of (old path, new path) pairs for the links that changed. With dryRun the links are only reported, not changed.
+        """
+        if index is None:
+            index = dirIndex(searchDir)
+        changes = []
+        media = _fixPaths(self.media, index, changes)
+        linkedFiles = _fixPaths(self.linkedFiles, index, changes)
+        if not dryRun:
+            self.media = media
+            self.linkedFiles = linkedFiles
+        return changes
+
+
+
+    def join(tierObj, tierA, tierB, how = "overlap"):
+        """An unbound function that pairs up the annotations of the tiers named tierA and tierB by time (see joinTiers)"""
+        tiers = {tr.tierName: tr for tr in tierObj.tiers}
+        return joinTiers(tiers[tierA], tiers[tierB], how=how)
+
+    def millisToFrames(tierObj, fps = (60.*(1000./1001.)), tierFps = None):
+        """An unbound function that converts every tier (in milliseconds) into frames. tierFps is an optional dictionary of frame rates for individual tiers, overriding fps."""
+        tierFps = tierFps or {}
+        for tr in tierObj.tiers:
+            tr.millisToFrames(tierFps.get(tr.tierName, fps))
+        return tierObj
+
+    def framesToMillis(tierObj, fps = (60.*(1000./1001.)), tierFps = None):
+        """An unbound function that converts every tier (in frames) into milliseconds. tierFps is an optional dictionary of frame rates for individual tiers, overriding fps."""
+        tierFps = tierFps or {}
+        for tr in tierObj.tiers:
+            tr.framesToMillis(tierFps.get(tr.tierName, fps))
+        return tierObj
 
     def selectedTiers(tierObj, tierNames):
-        """An unbound function that extracts the tiers given in the list tierNames"""
+        """An unbound function that extracts the tiers given in the list tierNames. To avoid parsing unwanted tiers at all, pass tierNames to tierSet when reading a file instead."""
         media = tierObj.media
         tiers = tierObj.tiers
         pathELAN = tierObj.pathELAN
+        tierNames = set(tierNames)
         newTiers = []
         for tr in tiers:
             if tr.tierName in tierNames:
@@ -224,9 +938,48 @@ class tierSet:
         tiers = newTiers
         return tierSet(file=None, media=media, tiers=tiers, pathELAN=pathELAN)
 
-    def miniTier(tierObj, begin, end, retimed = True):
-        """An unbound function that extracts a subset of a tier"""
-        verbose = False
+    def segment(tierObj, windows, destTemplate = "./clip{n}.eaf", retimed = True, overlap = False, workers = 1, sharedTimeSlots = False):
+        """
+        An unbound function that cuts a tier set into many clips at once, like calling miniTier and then writing each clip, returning the paths written.
+        windows are (begin, end) or (begin, end, name) tuples, and destTemplate is formatted with n (the window's position), begin, end, and name (n if not given) for each clip's path.
+        Each tier is swept once for all of the windows, and the clips are written with writeElan (across workers processes if more than 1).
+        """
+        windows = [tuple(window) for window in windows]
+        clipTiers = [[] for window in windows]
+        tZeros = [window[0] if retimed else 0 for window in windows]
+        for tr in tierObj.tiers or []:
+            annos = tr.annotations
+            for w, hits in enumerate(tr.timeIndex().sweep(windows, overlap=overlap)):
+                tZero = tZeros[w]
+                newAnnotations = []
+                for i in hits:
+                    anno = annos[i]
+                    newAnnotations.append(annotation(anno.begin-tZero, anno.end-tZero, anno.value, anno.units))
+                clipTiers[w].append(tier(tierName=tr.tierName, annotations=newAnnotations))
+
+        jobs = []
+        for w, window in enumerate(windows):
+            name = window[2] if len(window) > 2 else w
+            dest = destTemplate.format(n=w, begin=window[0], end=window[1], name=name)
+            destDir = os.path.dirname(dest)
+            if destDir:
+                os.makedirs(destDir, exist_ok=True)
+            clip = tierSet(file=None, media=tierObj.media, tiers=clipTiers[w], pathELAN=tierObj.pathELAN)
+            jobs.append((clip, dest))
+
+        if workers == 1:
+            for clip, dest in jobs:
+                tierSet.writeElan(clip, dest=dest, sharedTimeSlots=sharedTimeSlots)
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(_writeClip, clip, dest, sharedTimeSlots) for clip, dest in jobs]
+                for future in futures:
+                    future.result()
+        return [dest for clip, dest in jobs]
+
+    def miniTier(tierObj, begin, end, retimed = True, overlap = False):
+        """An unbound function that extracts a subset of a tier. By default only annotations contained in begin-end are kept, with overlap=True any annotation overlapping the window is."""
         media = tierObj.media
         tiers = tierObj.tiers
         pathELAN = tierObj.pathELAN
@@ -235,50 +988,26 @@ class tierSet:
             tZero = begin
         else:
             tZero = 0
-        if verbose: print("Zero: ",str(tZero))
         for tr in tiers:
             newAnnotations = []
             newTierName = tr.tierName
-            for anno in tr.annotations:
-                if anno.begin >= begin and anno.end <= end:
-                    newAnno = annotation(anno.begin-tZero, anno.end-tZero, anno.value, anno.units)
-                    if verbose: print("I added "+newAnno.value+": "+str(newAnno.begin)+"-"+str(newAnno.end))
-                    newAnnotations.append(newAnno)
-                ## else:
-                ##     print("Skipping, out of bounds.")
+            for anno in tr.annotationsBetween(begin, end, overlap=overlap):
+                newAnno = annotation(anno.begin-tZero, anno.end-tZero, anno.value, anno.units)
+                newAnnotations.append(newAnno)
             newTiers.append(tier(tierName=newTierName, annotations= newAnnotations))
         tiers = newTiers
         return tierSet(file=None, media=media, tiers=tiers, pathELAN=pathELAN)
 
-    def elanOut(tierObj, headFootFile = (impresources.files(templates) / "elanSkeleton.eaf"), dest = "./out.eaf"):
-        """An unbound function that returns an elan file from a tier."""
-        verbose = False
-        tree = ElementTree.parse(headFootFile)
-        root = tree.getroot()
+    @instrument.timed("elanOut")
+    def elanOut(tierObj, headFootFile = None, dest = "./out.eaf", sharedTimeSlots = False):
+        """An unbound function that returns an elan file from a tier. headFootFile defaults to the skeleton shipped with pyelan. With sharedTimeSlots, identical times share one time slot, and slots are sorted with short ids (ts1, ts2, ...)."""
+        root = _skeleton(_defaultSkeleton(headFootFile))
         destDir = os.path.dirname(os.path.abspath(dest))
 
-        # Set media for the elan file
-        mediaFiles = tierObj.media
+        # Set media and links for the elan file
         tree = ElementTree.ElementTree(root)
         header = root.findall('HEADER')
-
-        for mediaFile in mediaFiles:
-            media = ElementTree.SubElement(header[0], 'MEDIA_DESCRIPTOR')
-            media.set('MEDIA_URL', ''.join(["file://",os.path.abspath(mediaFile)]))
-            if os.path.splitext(mediaFile)[1] == ".wav":
-                media.set('MIME_TYPE', 'audio/*')
-            else:
-                media.set('MIME_TYPE', 'video/*')
-            media.set('RELATIVE_MEDIA_URL', ''.join(["./",os.path.relpath(os.path.abspath(mediaFile), destDir)]))
-
-        # Set the link
-        linkedFiles = tierObj.linkedFiles
-        if linkedFiles is not None and linkedFiles != [None]:
-                for fl in linkedFiles:
-                    media = ElementTree.SubElement(header[0], 'LINKED_FILE_DESCRIPTOR')
-                    media.set('LINK_URL', ''.join(["file://",os.path.abspath(fl)]))
-                    media.set('MIME_TYPE', 'unknown') # change to read file extension?
-                    media.set('RELATIVE_LINK_URL', ''.join(["./",os.path.relpath(os.path.abspath(fl), destDir)]))
+        header[0].extend(_headerDescriptors(tierObj, destDir))
 
         time_order = root[1]
 
@@ -289,9 +1018,15 @@ class tierSet:
         tslt = 0
         anot = 0
 
+        if sharedTimeSlots and tierObj.tiers != None:
+            slotIds = _sharedTimeSlots(tierObj.tiers)
+            for time_value, time_slot_id in slotIds.items():
+                time_slot = ElementTree.SubElement(time_order, "TIME_SLOT")
+                time_slot.attrib["TIME_SLOT_ID"] = time_slot_id
+                time_slot.attrib["TIME_VALUE"] = str(time_value)
+
         if tierObj.tiers != None:
             for tier in tierObj.tiers:
-                if verbose: print(tier.tierName)
                 workingTier = tier.tierName
                 #----------------------------------------------------
                 # Create a tier
@@ -304,21 +1039,12 @@ class tierSet:
 
                 #----------------------------------------------------
                 for anno in tier.annotations:
-                    if verbose: print("Working on time slot: "+str(tslt)+" and annotation: "+str(anot))
-                    tslt += 1
-                    time_slot_id0 = 'ts' + workingTier + str(tslt)
-                    time_value0 = str(anno.begin)
-                    time_slot = ElementTree.SubElement(time_order, "TIME_SLOT")
-                    time_slot.attrib["TIME_SLOT_ID"] = time_slot_id0
-                    time_slot.attrib["TIME_VALUE"] = time_value0
-
-                    tslt += 1
-                    time_slot_id1 = 'ts' + workingTier + str(tslt)
-                    # nx = int(float(nx)*1000)
-                    time_value1 = str(anno.end)
-                    time_slot = ElementTree.SubElement(time_order, "TIME_SLOT")
-                    time_slot.attrib["TIME_SLOT_ID"] = time_slot_id1
-                    time_slot.attrib["TIME_VALUE"] = time_value1
+                    if sharedTimeSlots:
+                        time_slot_id0 = slotIds[anno.begin]
+                        time_slot_id1 = slotIds[anno.end]
+                    else:
+                        time_slot_id0, time_slot_id1 = _addTimeSlots(time_order, workingTier, tslt, anno)
+                        tslt += 2
 
                     anot += 1
                     annotation_id = 'a' + str(anot)
@@ -331,13 +1057,76 @@ class tierSet:
                     anno_value = ElementTree.SubElement(alignable_annotation, "ANNOTATION_VALUE")
                     anno_value.text = anno.value
 
-                    if verbose: print(anno.value+": "+str(anno.begin)+"-"+str(anno.end))
-
         return tree
 
+    @instrument.timed("writeElan")
+    def writeElan(tierObj, dest = "./out.eaf", headFootFile = None, sharedTimeSlots = False):
+        """
+        An unbound function that writes an elan file for a tier set straight to dest, without building an ElementTree.
+        The skeleton is parsed once per process, the output is byte for byte what writing elanOut's tree gives, and memory does not grow with the number of annotations (other than the distinct times with sharedTimeSlots).
+        """
+        before, headerEnd, timeOrderEnd, end = _skeletonSplit(_defaultSkeleton(headFootFile))
+        destDir = os.path.dirname(os.path.abspath(dest))
+        tiers = tierObj.tiers or []
+
+        with open(dest, "wb") as fl:
+            def write(text):
+                fl.write(text.encode("us-ascii", "xmlcharrefreplace"))
+
+            write(before)
+            for descriptor in _headerDescriptors(tierObj, destDir):
+                write(ElementTree.tostring(descriptor, encoding="unicode"))
+            write(headerEnd)
+
+            if sharedTimeSlots:
+                slotIds = _sharedTimeSlots(tiers)
+                for value, slotId in slotIds.items():
+                    write('<TIME_SLOT TIME_SLOT_ID="%s" TIME_VALUE="%s" />' % (slotId, _escapeAttrib(str(value))))
+            else:
+                tslt = 0
+                for tr in tiers:
+                    tierId = _escapeAttrib(tr.tierName)
+                    for anno in tr.annotations:
+                        for value in (anno.begin, anno.end):
+                            tslt += 1
+                            write('<TIME_SLOT TIME_SLOT_ID="ts%s%d" TIME_VALUE="%s" />' % (tierId, tslt, _escapeAttrib(str(value))))
+            write(timeOrderEnd)
+
+            tslt = 0
+            anot = 0
+            for tr in tiers:
+                tierId = _escapeAttrib(tr.tierName)
+                tierStart = '<TIER ANNOTATOR="annoCompare" DEFAUTL_LOCALE="en" LINGUISTIC_TYPE_REF="default-lt" TIER_ID="%s"' % tierId
+                if len(tr.annotations) == 0:
+                    write(tierStart + ' />')
+                    continue
+                write(tierStart + '>')
+                for anno in tr.annotations:
+                    anot += 1
+                    if anno.value:
+                        value = '<ANNOTATION_VALUE>%s</ANNOTATION_VALUE>' % _escapeText(anno.value)
+                    else:
+                        value = '<ANNOTATION_VALUE />'
+                    if sharedTimeSlots:
+                        ref1 = slotIds[anno.begin]
+                        ref2 = slotIds[anno.end]
+                    else:
+                        ref1 = 'ts%s%d' % (tierId, tslt + 1)
+                        ref2 = 'ts%s%d' % (tierId, tslt + 2)
+                        tslt += 2
+                    write('<ANNOTATION><ALIGNABLE_ANNOTATION ANNOTATION_ID="a%d" TIME_SLOT_REF1="%s" TIME_SLOT_REF2="%s">%s</ALIGNABLE_ANNOTATION></ANNOTATION>' % (anot, ref1, ref2, value))
+                write('</TIER>')
+            write(end)
+
+    @instrument.timed("tableOut")
+    def tableOut(tierObj, dest, source=None):
+        """An unbound function that writes the annotations of a tier set to a binary, columnar table at dest that can be read back (memory mapped) with readTable. source is recorded as the file the annotations came from."""
+        from .table import writeTable
+        return writeTable(tierObj, dest, source=source)
+
+@instrument.timed("pfsxOut")
 def pfsxOut(tsConfigs):
         """An unbound function that returns the pfsx file for the list of TS configs given"""
-        verbose = False
 
 
         # Set media for the elan file
@@ -391,10 +1180,59 @@ class timeSeries:
         self.tracks = tracks
         self.timeCol = timeCol
         self.timeOrigin = timeOrigin
+        self._samples = None
+
+    def __getstate__(self):
+        # memory maps of the samples can't be pickled, they are reopened when needed
+        state = self.__dict__.copy()
+        state['_samples'] = None
+        return state
+
+    def samples(self, cacheDir=None, besideSource=False):
+        """Returns lazy, memory mapped access (a sampleData) to the csv this time series links to, parsing it into a binary cache the first time. The cache is kept in cacheDir (the user's cache directory by default), or next to the csv if besideSource is True."""
+        if getattr(self, '_samples', None) is None or self._samples.source != self.source:
+            from .samples import sampleData
+            columns = [trk.column for trk in self.tracks or []]
+            self._samples = sampleData(self.source, columns, timeCol=self.timeCol, cacheDir=cacheDir, besideSource=besideSource)
+        return self._samples
+
+    def detectRanges(self, delimiter=","):
+        """
+        Sets the range of every track from the minimum and maximum of its column, found in one streaming pass over the csv, so ELAN does not have to detect the ranges itself each time the file is opened.
+        Tracks with the detect-range property have it turned off. Tracks whose column has no numbers are left as they are.
+        """
+        from .samples import columnRanges
+        ranges = columnRanges(self.source, [trk.column for trk in self.tracks or []], timeCol=int(self.timeCol), delimiter=delimiter)
+        for trk in self.tracks or []:
+            if ranges[int(trk.column)] == [None, None]:
+                continue
+            trk.range = ranges[int(trk.column)]
+            if trk.properties and 'detect-range' in trk.properties:
+                trk.properties['detect-range'] = "false"
+        return self
 
+    def getTrack(self, name):
+        """Returns the track with the given name"""
+        for trk in self.tracks or []:
+            if trk.name == name:
+                return trk
+        raise KeyError(name)
+
+    def trackValues(self, name):
+        """Returns all of the (memory mapped) values for the track with the given name"""
+        return self.samples().column(self.getTrack(name).column)
+
+    def window(self, begin, end, tracks=None):
+        """Returns a dictionary of track name to the (memory mapped) values of the samples between begin and end (in annotation time, i.e. after timeOrigin), for the named tracks or all of them"""
+        origin = self.timeOrigin or 0
+        trackList = self.tracks if tracks is None else [self.getTrack(name) for name in tracks]
+        data = self.samples()
+        start, stop = data.rows(begin + origin, end + origin)
+        return {trk.name: data.column(trk.column)[start:stop] for trk in trackList}
+
+    @instrument.timed("parseTimeSeries")
     def extractTimeSeries(self, file):
         """A function that extracts information from an already existing TS file. To do"""
-        verbose = False
         tree = ElementTree.parse(file)
         root = tree.getroot()
         rootLen = len(root)
@@ -431,17 +1269,27 @@ class timeSeries:
             trackList.append(track(name, column, row, range, color, properties, deriv))
         return source, sampleType, trackList, timeCol, timeOrigin
 
-    def fixLinks(self, searchDir="./"):
-        """A function that fixes links in a tsconf file by searching recursively through the search directory, and then links the best matches for each file."""
-        self.source = os.path.abspath(findPathMatch(self.source, searchDir=searchDir))
-
+    def fixLinks(self, searchDir="./", index=None, dryRun=False):
+        """
+        A function that fixes links in a tsconf file by searching recursively through the search directory, and then links the best matches for each file. A dirIndex can be given as index to avoid walking the search directory again.
+        Returns a list of (old path, new path) pairs for the links that changed. With dryRun the links are only reported, not changed.
+        """
+        source = os.path.abspath(findPathMatch(self.source, searchDir=searchDir, index=index))
+        if source == self.source:
+            return []
+        changes = [(self.source, source)]
+        if not dryRun:
+            self.source = source
+        return changes
+
+    @instrument.timed("timeSeriesOut")
     def timeSeriesOut(tsObj):
         """An unbound function that returns the time series configuration file for the ts object"""
-        verbose = False
 
         # Set media for the elan file
         tree = ElementTree.ElementTree()
         root = ElementTree.Element("timeseries")
+        import datetime
         dt = str(datetime.datetime.now()).replace(" ","T")
         root.set('date', dt)
         root.set('version', "1.0")
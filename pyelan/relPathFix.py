@@ -1,29 +1,120 @@
-import sys, os, re, shutil
-import pyelan as pyelan
+import sys, re, shutil, argparse
+from . import pyelan
+from .parallel import runJobs
 
-# python realPathFix.py [search path] [files]
-searchDir = sys.argv[1]
+# python -m pyelan.relPathFix [search path] [files]
 
-eafFiles = sys.argv[2:]
-for eafFile in eafFiles:
-    # backup eaf file
-    # is there a better way to backup old files?
-    shutil.copyfile(eafFile, '.'.join([eafFile, "bak"]))
-    eafPath = os.path.dirname(eafFile)
+class relinkResult:
+    """The outcome of relinking one file: how long it took, any tsconf files it links to, the (old path, new path) links that changed, and the error if it failed"""
+    def __init__(self, file, kind, seconds=0., linkedTsconfs=None, changes=None, error=None):
+        self.file = file
+        self.kind = kind
+        self.seconds = seconds
+        self.linkedTsconfs = linkedTsconfs or []
+        self.changes = changes or []
+        self.error = error
 
+    @property
+    def ok(self):
+        return self.error is None
+
+def fixEaf(eafFile, index, dryRun=False):
+    """
+    Fixes the links in an eaf file and returns the tsconf files it links to along with the links that changed.
+    The file is only backed up and (atomically) rewritten if a link changed, and never with dryRun.
+    """
     fl = pyelan.tierSet(file = eafFile)
-    fl.fixLinks(searchDir = searchDir)
+    changes = fl.fixLinks(index = index)
+
+    if changes and not dryRun:
+        # backup eaf file
+        shutil.copyfile(eafFile, '.'.join([eafFile, "bak"]))
+        eafOut = pyelan.tierSet.elanOut(fl, dest=eafFile)
+        pyelan.writeAtomic(eafOut, eafFile)
+    return [tsconf for tsconf in fl.linkedFiles or [] if re.match(".*tsconf.xml", tsconf)], changes
+
+def fixTsconf(tsconf, index, dryRun=False):
+    """
+    Fixes the link in a tsconf file and returns the links that changed.
+    The file is only backed up and (atomically) rewritten if the link changed, and never with dryRun.
+    """
+    ts = pyelan.timeSeries(file = tsconf)
+    changes = ts.fixLinks(index = index)
 
-    for tsconf in filter(lambda s: re.match(".*tsconf.xml", s), fl.linkedFiles):
+    if changes and not dryRun:
         # backup tsconf file
-        # is there a better way to backup old files?
-        shutil.copyfile(tsconf, '.'.join([tsconf, "bak"])) 
-        
-        ts = pyelan.timeSeries(file = tsconf)
-        ts.fixLinks(searchDir = searchDir)
-        
+        shutil.copyfile(tsconf, '.'.join([tsconf, "bak"]))
         tsOut = pyelan.timeSeries.timeSeriesOut(ts)
-        tsOut[0].write(tsconf)
+        pyelan.writeAtomic(tsOut[0], tsconf)
+    return changes
+
+_workerIndex = None
+
+def _initWorker(index):
+    global _workerIndex
+    _workerIndex = index
+
+def _relink(file, kind, dryRun=False):
+    """Runs one fix with the worker's index, returning the tsconf files the file links to and the links that changed"""
+    if kind == "eaf":
+        return fixEaf(file, _workerIndex, dryRun)
+    return [], fixTsconf(file, _workerIndex, dryRun)
+
+def _runAll(jobs, index, workers, dryRun):
+    """Runs (file, kind) jobs, with every worker sharing one index, and yields relinkResults as they complete"""
+    for (file, kind, _), result, error, seconds in runJobs(_relink, [(file, kind, dryRun) for file, kind in jobs], workers, initializer=_initWorker, initargs=(index,)):
+        if error is None:
+            tsconfs, changes = result
+            yield relinkResult(file, kind, seconds, linkedTsconfs=tsconfs, changes=changes)
+        else:
+            yield relinkResult(file, kind, seconds, error=error)
+
+def relinkFiles(eafFiles, searchDir="./", workers=None, index=None, dryRun=False):
+    """
+    Fixes the links of many eaf files and the tsconf files they link to, searching searchDir (walked once) for the linked files.
+    Files are processed across workers processes (all cores if None), each tsconf is rewritten once no matter how many eaf files link to it, and failures are reported in the results rather than stopping the batch.
+    Only files with links that changed are backed up and rewritten; with dryRun nothing is written and the results just report the changes.
+    Returns a list of relinkResults, eaf files first.
+    """
+    if index is None:
+        index = pyelan.dirIndex(searchDir)
+
+    results = list(_runAll([(eafFile, "eaf") for eafFile in eafFiles], index, workers, dryRun))
+
+    tsconfs = []
+    seen = set()
+    for result in results:
+        for tsconf in result.linkedTsconfs:
+            if tsconf not in seen:
+                seen.add(tsconf)
+                tsconfs.append(tsconf)
+    results.extend(_runAll([(tsconf, "tsconf") for tsconf in tsconfs], index, workers, dryRun))
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fix the media and linked file paths of eaf files (and the tsconf files they link to) that have been moved.")
+    parser.add_argument("searchDir", help="the directory to search (recursively) for the linked files")
+    parser.add_argument("eafFiles", nargs="+", help="the eaf files to fix")
+    parser.add_argument("--workers", type=int, default=None, help="the number of processes to use (default: all cores)")
+    parser.add_argument("--dry-run", action="store_true", help="only report the links that would change, without writing anything")
+    args = parser.parse_args(argv)
+
+    results = relinkFiles(args.eafFiles, searchDir=args.searchDir, workers=args.workers, dryRun=args.dry_run)
+    failed = 0
+    for result in results:
+        if result.ok:
+            if not result.changes:
+                print("unchanged %s (%.3fs)" % (result.file, result.seconds))
+                continue
+            print("%s %s (%.3fs)" % ("would fix" if args.dry_run else "fixed", result.file, result.seconds))
+            for old, new in result.changes:
+                print("    %s -> %s" % (old, new))
+        else:
+            failed += 1
+            print("failed %s (%.3fs)\n%s" % (result.file, result.seconds, result.error), file=sys.stderr)
+    changed = sum(1 for result in results if result.changes)
+    print("%d files checked, %d with changed links, %d failed" % (len(results), changed, failed))
+    return 1 if failed else 0
 
-    eafOut = pyelan.tierSet.elanOut(fl, dest=eafPath)
-    eafOut.write(eafFile)
\ No newline at end of file
+if __name__ == "__main__":
+    sys.exit(main())
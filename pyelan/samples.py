@@ -0,0 +1,166 @@
+import os, csv, json, array, bisect, hashlib, tempfile, shutil
+from .mapped import mappedFiles
+
+# the file of doubles each cached column is kept in, in a build directory
+COLUMN_FILE = "col%d.f64"
+
+def columnRanges(source, columns, timeCol=None, delimiter=","):
+    """
+    Finds the minimum and maximum of several columns of a csv in a single streaming pass (only one row is held at a time), returning a dictionary of column to [min, max] ([None, None] if a column has no numbers).
+    Cells that are not numbers are skipped, as are whole rows without a numeric time if timeCol is given.
+    """
+    columns = sorted(set(int(col) for col in columns))
+    lows = {col: float("inf") for col in columns}
+    highs = {col: float("-inf") for col in columns}
+    with open(source, newline="") as fl:
+        for row in csv.reader(fl, delimiter=delimiter):
+            if timeCol is not None:
+                try:
+                    float(row[timeCol])
+                except (ValueError, IndexError):
+                    continue
+            for col in columns:
+                try:
+                    value = float(row[col])
+                except (ValueError, IndexError):
+                    continue
+                if value != value:
+                    # nan
+                    continue
+                if value < lows[col]:
+                    lows[col] = value
+                if value > highs[col]:
+                    highs[col] = value
+    return {col: [lows[col], highs[col]] if lows[col] <= highs[col] else [None, None] for col in columns}
+
+def userCacheDir():
+    """Returns the directory pyelan keeps sample caches in by default: pyelan/samples under XDG_CACHE_HOME (or LOCALAPPDATA on windows, or ~/.cache)"""
+    root = os.environ.get("XDG_CACHE_HOME") or os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(root, "pyelan", "samples")
+
+class sampleData:
+    """
+    Lazy, column by column access to the samples in a csv file linked from a tsconf.
+    The csv is parsed once (in chunks, so memory stays bounded) into a binary cache with one file of doubles per column, which is then memory mapped: reading a column or a time window only touches the pages it needs.
+    The cache is kept in cacheDir (the user's cache directory by default, see userCacheDir), or next to the csv if besideSource is True.
+    The cache is rebuilt if the csv changes, or if a column that is not cached yet is asked for. Each build is written to a new directory that meta.json is then switched to, so columns that are already mapped (here or in another process) are never changed underneath.
+    Rows without a numeric time (e.g. a header row) are skipped, and other cells that are not numbers are read as nan.
+    """
+    def __init__(self, source, columns, timeCol=0, cacheDir=None, delimiter=",", chunkRows=65536, besideSource=False):
+        self.source = source
+        self.timeCol = int(timeCol)
+        self.columns = sorted(set(int(col) for col in columns) | {self.timeCol})
+        self.delimiter = delimiter
+        self.chunkRows = chunkRows
+        if besideSource:
+            self.cacheDir = source + ".pyelan-cache"
+        else:
+            self.cacheDir = os.path.join(cacheDir or userCacheDir(), hashlib.sha1(os.path.abspath(source).encode("utf-8")).hexdigest())
+        self._files = None
+        self._open()
+
+    def __len__(self):
+        return self.nRows
+
+    def _signature(self):
+        st = os.stat(self.source)
+        return [st.st_mtime_ns, st.st_size]
+
+    def _metaPath(self):
+        return os.path.join(self.cacheDir, "meta.json")
+
+    def _colPath(self, col, build=None):
+        return os.path.join(self.cacheDir, build or self.build, COLUMN_FILE % col)
+
+    def _readMeta(self):
+        try:
+            with open(self._metaPath()) as fl:
+                return json.load(fl)
+        except (OSError, ValueError):
+            return None
+
+    def _open(self):
+        """Uses the cache if it is up to date and has every column needed, otherwise (re)builds it first"""
+        meta = self._readMeta()
+        if meta is None or meta["signature"] != self._signature() or not set(self.columns) <= set(meta["columns"]) or not os.path.isdir(os.path.join(self.cacheDir, meta["build"])):
+            if meta is not None and meta["signature"] == self._signature():
+                self.columns = sorted(set(self.columns) | set(meta["columns"]))
+            meta = self._build()
+        self.nRows = meta["nRows"]
+        self.build = meta["build"]
+        if self._files is not None:
+            self._files.close()
+        self._files = mappedFiles(os.path.join(self.cacheDir, self.build))
+
+    def _build(self):
+        """Parses the csv in one pass, appending each chunk of rows to a file per column in a new build directory, then points meta.json at it"""
+        os.makedirs(self.cacheDir, exist_ok=True)
+        signature = self._signature()
+        build = os.path.basename(tempfile.mkdtemp(dir=self.cacheDir, prefix="build-"))
+        nRows = 0
+        outs = {col: open(self._colPath(col, build), "wb") for col in self.columns}
+        try:
+            chunks = {col: array.array('d') for col in self.columns}
+            with open(self.source, newline="") as fl:
+                for row in csv.reader(fl, delimiter=self.delimiter):
+                    try:
+                        float(row[self.timeCol])
+                    except (ValueError, IndexError):
+                        # header rows, or anything else without a time
+                        continue
+                    for col, chunk in chunks.items():
+                        try:
+                            chunk.append(float(row[col]))
+                        except (ValueError, IndexError):
+                            chunk.append(float("nan"))
+                    nRows += 1
+                    if nRows % self.chunkRows == 0:
+                        for col, chunk in chunks.items():
+                            chunk.tofile(outs[col])
+                            del chunk[:]
+            for col, chunk in chunks.items():
+                chunk.tofile(outs[col])
+        finally:
+            for out in outs.values():
+                out.close()
+        meta = {"signature": signature, "columns": self.columns, "nRows": nRows, "build": build}
+        old = self._readMeta()
+        fd, tmpPath = tempfile.mkstemp(dir=self.cacheDir, prefix=".meta", suffix=".tmp")
+        with os.fdopen(fd, "w") as fl:
+            json.dump(meta, fl)
+        os.replace(tmpPath, self._metaPath())
+        if old is not None and old.get("build") and old["build"] != build:
+            # maps of the old build stay valid (the files are only unlinked), but on some platforms they can't be removed while they are mapped
+            shutil.rmtree(os.path.join(self.cacheDir, old["build"]), ignore_errors=True)
+        return meta
+
+    def column(self, col):
+        """Returns a column as a (read only, memory mapped) sequence of doubles. Every call gives a new view, which stays valid after close() or a rebuild. A column that isn't mapped yet is read from the current build, even if another reader rebuilt the cache since this one was opened."""
+        col = int(col)
+        if col not in self.columns:
+            self.columns = sorted(set(self.columns) | {col})
+            self._open()
+        try:
+            return self._files.view(COLUMN_FILE % col, 'd')
+        except FileNotFoundError:
+            # another reader rebuilt the cache (and removed this build) since it was opened
+            self._open()
+            return self.column(col)
+
+    def times(self):
+        """Returns the time column"""
+        return self.column(self.timeCol)
+
+    def rows(self, begin, end):
+        """Returns the (start, stop) rows of the samples with times in begin-end (inclusive), assuming the times are sorted"""
+        times = self.times()
+        return bisect.bisect_left(times, begin), bisect.bisect_right(times, end)
+
+    def window(self, begin, end, columns):
+        """Returns a dictionary of column to the (memory mapped) samples with times in begin-end"""
+        start, stop = self.rows(begin, end)
+        return {col: self.column(col)[start:stop] for col in columns}
+
+    def close(self):
+        """Unmaps the cached columns until they are next read (views of them already handed out can still be read)"""
+        self._files.close()
@@ -0,0 +1,170 @@
+"""
+A compact binary, columnar copy of the annotations in tierSets (or a whole corpus) for analytics, so repeated runs read annotations without parsing any xml.
+A table is a directory with one binary file per column (begin, end, tier, file, units, and the values as utf-8 with their offsets) and a meta.json, and is read back with memory maps.
+
+    from pyelan import writeTable, readTable
+    writeTable(loadCorpus("data/**/*.eaf"), "annotations.table")
+    table = readTable("annotations.table")
+    df = pandas.DataFrame(table.columns())
+"""
+import os, sys, json, array, itertools
+from . import pyelan
+from .mapped import mappedFiles
+
+VERSION = 1
+
+# column name: (file name, array type code)
+COLUMNS = {
+    "begin": ("begin.i64", 'q'),
+    "end": ("end.i64", 'q'),
+    "tier": ("tier.i32", 'i'),
+    "file": ("file.i32", 'i'),
+    "units": ("units.u8", 'B'),
+    "missing": ("missing.u8", 'B'),
+    "valueOffsets": ("value.off", 'q'),
+}
+VALUES = "value.utf8"
+
+def _sources(tierSets, source):
+    """Returns (file, tierSet) pairs from a tierSet, a corpusSet, a dictionary of file to tierSet, or an iterable of (file, tierSet) pairs"""
+    if isinstance(tierSets, pyelan.tierSet):
+        return [(source, tierSets)]
+    if hasattr(tierSets, "tierSets"):
+        tierSets = tierSets.tierSets
+    if isinstance(tierSets, dict):
+        tierSets = tierSets.items()
+    return tierSets
+
+def _tierColumns(tr):
+    """Returns the begins, ends, values, and units of a tier, straight from the columns for a columnarTier"""
+    if isinstance(tr, pyelan.columnarTier):
+        return tr.begins, tr.ends, tr.values, itertools.repeat(tr.units, len(tr.begins))
+    annos = tr.annotations
+    return ([anno.begin for anno in annos], [anno.end for anno in annos], [anno.value for anno in annos], [anno.units for anno in annos])
+
+def writeTable(tierSets, dest, source=None):
+    """
+    Writes the annotations of tierSets (a tierSet, a corpusSet, a dictionary of file to tierSet, or an iterable of (file, tierSet) pairs) to the table directory dest, one tier at a time so memory does not grow with the number of files.
+    source is the file recorded for a single tierSet. Media and linked files are not kept, only the annotations. meta.json is written last, so a table that was not finished is never read.
+    Returns the number of annotations written.
+    """
+    os.makedirs(dest, exist_ok=True)
+    metaPath = os.path.join(dest, "meta.json")
+    if os.path.exists(metaPath):
+        os.remove(metaPath)
+    files, tierNames, unitNames = [], {}, {}
+    blocks = []
+    nRows = 0
+    offset = 0
+    outs = {name: open(os.path.join(dest, fileName), "wb") for name, (fileName, code) in COLUMNS.items()}
+    try:
+        with open(os.path.join(dest, VALUES), "wb") as valueOut:
+            array.array('q', [0]).tofile(outs["valueOffsets"])
+            for file, tierObj in _sources(tierSets, source):
+                if tierObj is None:
+                    continue
+                files.append(None if file is None else os.fspath(file))
+                fileCode = len(files) - 1
+                for tr in tierObj.tiers:
+                    begins, ends, values, units = _tierColumns(tr)
+                    n = len(values)
+                    tierCode = tierNames.setdefault(tr.tierName, len(tierNames))
+                    array.array('q', begins).tofile(outs["begin"])
+                    array.array('q', ends).tofile(outs["end"])
+                    array.array('i', itertools.repeat(tierCode, n)).tofile(outs["tier"])
+                    array.array('i', itertools.repeat(fileCode, n)).tofile(outs["file"])
+                    array.array('B', [unitNames.setdefault(unit, len(unitNames)) for unit in units]).tofile(outs["units"])
+                    array.array('B', [value is None for value in values]).tofile(outs["missing"])
+                    encoded = [(value or "").encode("utf-8") for value in values]
+                    valueOut.write(b"".join(encoded))
+                    offsets = array.array('q', itertools.accumulate((len(value) for value in encoded), initial=offset))
+                    offsets[1:].tofile(outs["valueOffsets"])
+                    offset = offsets[-1]
+                    blocks.append([fileCode, tierCode, nRows, nRows + n])
+                    nRows += n
+    finally:
+        for out in outs.values():
+            out.close()
+    meta = {"version": VERSION, "byteorder": sys.byteorder, "nRows": nRows, "files": files, "tiers": list(tierNames), "units": list(unitNames), "blocks": blocks}
+    with open(metaPath, "w") as fl:
+        json.dump(meta, fl)
+    return nRows
+
+def readTable(src):
+    """Opens a table written by writeTable (see annotationTable)"""
+    return annotationTable(src)
+
+class annotationTable:
+    """
+    Memory mapped access to a table of annotations written by writeTable. Each column is only mapped when it is first asked for, and reading a column or a range of rows only touches the pages it needs.
+    tier, file, and units are stored as codes into the tiers, files, and unitNames lists. blocks has a (file, tier, start, stop) row range for every tier written.
+    """
+    def __init__(self, src):
+        self.src = src
+        try:
+            with open(os.path.join(src, "meta.json")) as fl:
+                meta = json.load(fl)
+        except OSError:
+            raise ValueError("Not a pyelan table (or it was not finished): " + str(src))
+        if meta.get("version") != VERSION:
+            raise ValueError("Unsupported table version: " + str(meta.get("version")))
+        if meta["byteorder"] != sys.byteorder:
+            raise ValueError("The table was written on a " + meta["byteorder"] + " endian machine")
+        self.nRows = meta["nRows"]
+        self.files = meta["files"]
+        self.tiers = meta["tiers"]
+        self.unitNames = meta["units"]
+        self.blocks = [tuple(block) for block in meta["blocks"]]
+        self._files = mappedFiles(src)
+
+    def __len__(self):
+        return self.nRows
+
+    def column(self, name):
+        """Returns one of the stored columns (begin, end, tier, file, units, missing, or valueOffsets) as a memory mapped sequence of numbers (see COLUMNS for their types)"""
+        fileName, code = COLUMNS[name]
+        return self._files.view(fileName, code)
+
+    def values(self, start=0, stop=None):
+        """Returns the annotation values of rows start-stop as a list of strings (None where an annotation has no value)"""
+        stop = self.nRows if stop is None else stop
+        offsets = self.column("valueOffsets")[start:stop + 1]
+        missing = self.column("missing")[start:stop]
+        if stop <= start:
+            return []
+        base = offsets[0]
+        blob = self._files.get(VALUES)[base:offsets[-1]]
+        return [None if missing[i] else blob[offsets[i] - base:offsets[i + 1] - base].decode("utf-8") for i in range(stop - start)]
+
+    def columns(self):
+        """Returns a dictionary of file, tier, begin, end, value, and units columns (e.g. for pandas.DataFrame). begin and end are memory mapped, the others are lists."""
+        files, tiers, unitNames = self.files, self.tiers, self.unitNames
+        return {
+            "file": [files[code] for code in self.column("file")],
+            "tier": [tiers[code] for code in self.column("tier")],
+            "begin": self.column("begin"),
+            "end": self.column("end"),
+            "value": self.values(),
+            "units": [unitNames[code] for code in self.column("units")],
+        }
+
+    def tierSets(self, files=None, tierNames=None):
+        """Returns a dictionary of file to tierSet of columnarTiers, for every file (or only those in files), with every tier (or only those in tierNames)"""
+        files = set(files) if files is not None else None
+        tierNames = set(tierNames) if tierNames is not None else None
+        begins, ends, units = self.column("begin"), self.column("end"), self.column("units")
+        tiersByFile = {fileCode: [] for fileCode, file in enumerate(self.files) if files is None or file in files}
+        for fileCode, tierCode, start, stop in self.blocks:
+            tierName = self.tiers[tierCode]
+            if fileCode not in tiersByFile or (tierNames is not None and tierName not in tierNames):
+                continue
+            tr = pyelan.columnarTier(tierName, units=self.unitNames[units[start]] if stop > start else "ms")
+            tr.begins = array.array('q', begins[start:stop].tobytes())
+            tr.ends = array.array('q', ends[start:stop].tobytes())
+            tr.values = [pyelan._internValue(value) for value in self.values(start, stop)]
+            tiersByFile[fileCode].append(tr)
+        return {self.files[fileCode]: pyelan.tierSet(media=[], tiers=tiers, pathELAN=os.path.dirname(self.files[fileCode] or "")) for fileCode, tiers in tiersByFile.items()}
+
+    def close(self):
+        """Unmaps the table's files, e.g. before it is rewritten (columns already handed out can still be read)"""
+        self._files.close()
@@ -0,0 +1,41 @@
+import pytest
+import math
+
+from pyelan.pyelan import annotation, tier, timeSeries, track
+from pyelan.aggregate import aggregateTier
+
+def test_aggregate_tier(tmp_path):
+    source = tmp_path / "data.csv"
+    with open(source, "w") as fl:
+        for n in range(100):
+            fl.write("%d,%d\n" % (n * 10 + 100, (n * 7) % 20))
+    ts = timeSeries(source=str(source), timeOrigin=100, tracks=[track("a", 1, properties={})])
+
+    tr = tier("test", [annotation(200, 240, "y"), annotation(0, 30, "x"), annotation(5000, 6000, "empty"), annotation(3, 4, "frames", units="frames")])
+    result = aggregateTier(tr, ts, fps=25)
+    assert result["value"] == ["y", "x", "empty", "frames"]
+    # samples 20-24 are 0, 7, 14, 1, 8
+    assert result["a_mean"][0] == 6.
+    assert (result["a_min"][0], result["a_max"][0], result["a_peakTime"][0]) == (0., 14., 220.)
+    assert list(result["a_max"][1:2]) == [14.]
+    assert math.isnan(result["a_mean"][2])
+    # frames 3-4 at 25 fps are 121-200ms
+    assert (result["begin"][3], result["end"][3]) == (121, 200)
+    assert result["a_mean"][3] == sum((n * 7) % 20 for n in range(13, 21)) / 8.
+
+    with pytest.raises(ValueError):
+        aggregateTier(tr, ts, stats=["median"])
+
+def test_aggregate_tier_missing_samples(tmp_path):
+    source = tmp_path / "data.csv"
+    source.write_text("0,\n10,1\n20,2\n30,\n40,5\n50,\n")
+    ts = timeSeries(source=str(source), tracks=[track("a", 1, properties={})])
+    tr = tier("test", [annotation(0, 20, "x"), annotation(10, 40, "overlapping"), annotation(0, 0, "missing"), annotation(45, 100, "end")])
+    result = aggregateTier(tr, ts)
+    # missing samples are skipped rather than poisoning (or crashing) the statistics
+    assert list(result["a_mean"][0:2]) == [1.5, 8 / 3.]
+    assert list(result["a_min"][0:2]) == [1., 1.]
+    assert list(result["a_max"][0:2]) == [2., 5.]
+    assert list(result["a_peakTime"][0:2]) == [20., 40.]
+    for stat in ("mean", "min", "max", "peakTime"):
+        assert math.isnan(result["a_" + stat][2]) and math.isnan(result["a_" + stat][3])
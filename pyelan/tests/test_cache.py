@@ -0,0 +1,45 @@
+import pytest
+import os
+import shutil
+from pathlib import Path
+
+from pyelan.cache import fileCache
+
+TEST_DATA_DIR = Path(__file__).resolve().parent
+
+def test_file_cache(tmp_path):
+    eaf = tmp_path / "Letters.eaf"
+    shutil.copyfile(TEST_DATA_DIR / "Letters.eaf", eaf)
+
+    cache = fileCache(cacheDir=tmp_path / "cache")
+    first = cache.tierSet(eaf)
+    first.tiers[0].annotations.clear()
+    second = cache.tierSet(eaf)
+    assert len(second.tiers[0].annotations) == 59
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # a new cache (e.g. in another process) picks the file up from disk
+    other = fileCache(cacheDir=tmp_path / "cache")
+    assert len(other.tierSet(eaf).tiers[0].annotations) == 59
+    assert (other.diskHits, other.misses) == (1, 0)
+
+    # changing the file invalidates the entry
+    eaf.write_text(eaf.read_text().replace('TIER_ID="JK"', 'TIER_ID="KJ"'))
+    os.utime(eaf, ns=(0, 0))
+    assert cache.tierSet(eaf).tiers[0].tierName == "KJ"
+    assert cache.misses == 2
+
+    # list and set arguments are part of the key
+    assert [tr.tierName for tr in cache.tierSet(eaf, tierNames=["KJ"]).tiers] == ["KJ"]
+    assert cache.tierSet(eaf, tierNames={"missing"}).tiers == []
+    assert len(cache.tierSet(eaf, tierNames={"KJ"}, window=[0, 10000]).tiers) == 1
+    assert cache.hits == 1
+    cache.tierSet(eaf, tierNames=["KJ"])
+    assert cache.hits == 2
+
+def test_file_cache_eviction(tmp_path):
+    cache = fileCache(maxBytes=1)
+    cache.tierSet(TEST_DATA_DIR / "Letters.eaf")
+    cache.tierSet(TEST_DATA_DIR / "Letters.eaf", columnar=True)
+    assert cache.stats()["entries"] == 1
+    assert cache.evictions == 1
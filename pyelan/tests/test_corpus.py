@@ -0,0 +1,51 @@
+import pytest
+import shutil
+from pathlib import Path
+
+from pyelan.corpus import loadCorpus, iterCorpus
+
+TEST_DATA_DIR = Path(__file__).resolve().parent
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_load_corpus(tmp_path, workers):
+    for n in range(3):
+        shutil.copyfile(TEST_DATA_DIR / "Letters.eaf", tmp_path / ("session%d.eaf" % n))
+    (tmp_path / "broken.eaf").write_text("<ANNOTATION_DOCUMENT>")
+
+    loaded = loadCorpus(str(tmp_path / "*.eaf"), tiers=["JK"], workers=workers)
+    assert list(loaded.tierSets) == [str(tmp_path / ("session%d.eaf" % n)) for n in range(3)]
+    assert list(loaded.errors) == [str(tmp_path / "broken.eaf")]
+    assert len(loaded[str(tmp_path / "session0.eaf")].tiers[0].annotations) == 59
+
+    assert sorted(file for file, tiers, error in iterCorpus(str(tmp_path / "*.eaf"), tiers=["missing"], workers=workers) if error is None and tiers.tiers == []) == \
+        [str(tmp_path / ("session%d.eaf" % n)) for n in range(3)]
+
+def test_corpus_join(tmp_path):
+    for n in range(2):
+        shutil.copyfile(TEST_DATA_DIR / "Letters.eaf", tmp_path / ("session%d.eaf" % n))
+    loaded = loadCorpus(str(tmp_path / "*.eaf"), workers=1)
+    pairs = list(loaded.join("JK", "JK", how="within"))
+    assert len(pairs) == 2 * 59
+    assert all((a.begin, a.end) == (b.begin, b.end) for file, a, b in pairs)
+    assert list(loaded.join("JK", "missing")) == []
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_corpus_module_and_edits(tmp_path, workers):
+    import pyelan
+    import pyelan.corpus as module
+    assert module.loadCorpus is loadCorpus
+    assert pyelan.corpus is module
+
+    for n in range(2):
+        shutil.copyfile(TEST_DATA_DIR / "Letters.eaf", tmp_path / ("session%d.eaf" % n))
+    loaded = loadCorpus(str(tmp_path / "*.eaf"), workers=workers)
+    tr = loaded[str(tmp_path / "session0.eaf")].tiers[0]
+    # workers send columnar tiers, which are turned back into regular ones
+    assert type(tr) is pyelan.tier
+    assert isinstance(loadCorpus(str(tmp_path / "*.eaf"), workers=workers, columnar=True)[str(tmp_path / "session0.eaf")].tiers[0], pyelan.columnarTier)
+    # like tierSet(file=...), annotations can be edited in place
+    first = tr.annotations[0].begin
+    for anno in tr.annotations:
+        anno.millisToFrames(fps=30)
+    assert tr.annotations[0].begin == int(first / (1000. / 30))
+    assert tr.annotations[0].units == "frames"
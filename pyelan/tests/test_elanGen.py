@@ -1,6 +1,7 @@
 import pytest
 import os
 import tempfile
+import json
 from pathlib import Path
 
 from pyelan.pyelan import *
@@ -17,3 +18,27 @@ def test_tierset():
     out.write(os.path.join(dir, "test.eaf"))
     assert os.path.exists(os.path.join(dir, "test.eaf"))
 
+
+def test_manifest(tmp_path):
+    from pyelan.elanGen import main
+    from xml.etree import ElementTree
+
+    sessions = []
+    for n in range(2):
+        csvs = []
+        for part in ("a", "b"):
+            csv = tmp_path / ("session%d_%s.csv" % (n, part))
+            csv.write_text("0,1\n10,5\n")
+            csvs.append({"file": str(csv), "tracks": [{"name": part, "column": 1}]})
+        sessions.append({"saveDir": str(tmp_path / "out"), "basename": "session%d" % n, "media": [str(tmp_path / "session.mov")], "csvs": csvs})
+    sessions.append({"saveDir": str(tmp_path / "out"), "basename": "broken", "media": [], "csvs": [{"file": "missing.csv", "tracks": [{"name": "x", "column": 1}]}]})
+    manifest = tmp_path / "sessions.jsonl"
+    manifest.write_text("\n".join(json.dumps(session) for session in sessions))
+
+    assert main(["--manifest", str(manifest), "--workers", "1"]) == 1
+    for n in range(2):
+        assert os.path.exists(tmp_path / "out" / ("session%d.eaf" % n))
+        pfsx = ElementTree.parse(tmp_path / "out" / ("session%d.pfsx" % n)).getroot()
+        assert [pref.find("String").text for pref in pfsx.findall("prefList")] == ["a", "b"]
+        rng = ElementTree.parse(tmp_path / "out" / ("session%d_a_tsconf.xml" % n)).getroot().find("tracksource/track/range")
+        assert (rng.attrib["min"], rng.attrib["max"]) == ("1.0", "5.0")
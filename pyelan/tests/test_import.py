@@ -0,0 +1,23 @@
+import pytest
+import json, subprocess, sys
+
+# modules that only some features need, and that importing pyelan should not pull in
+DEFERRED = ["concurrent.futures", "multiprocessing", "importlib.resources", "tempfile", "shutil", "json", "pickle", "hashlib", "logging", "datetime", "pyelan.samples", "pyelan.cache", "pyelan.aggregate", "pyelan.table", "pyelan.mapped", "mmap"]
+
+def test_import_is_lazy():
+    # json is used to report the modules, so it is only checked for once pyelan has been imported
+    code = "import sys, pyelan; loaded = sorted(sys.modules); import json; print(json.dumps(loaded))"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    loaded = set(json.loads(out))
+    assert "pyelan.pyelan" in loaded
+    assert sorted(loaded.intersection(DEFERRED)) == []
+
+def test_lazy_attributes():
+    import pyelan
+    from pyelan.cache import fileCache
+    from pyelan.aggregate import aggregateTier
+    assert pyelan.fileCache is fileCache
+    assert pyelan.aggregateTier is aggregateTier
+    assert "fileCache" in dir(pyelan)
+    with pytest.raises(AttributeError):
+        pyelan.notAThing
@@ -0,0 +1,32 @@
+import pytest
+import logging
+from pathlib import Path
+
+from pyelan import instrument
+from pyelan.pyelan import *
+
+TEST_DATA_DIR = Path(__file__).resolve().parent
+
+def test_instrument(tmp_path, caplog):
+    events = []
+    instrument.reset()
+    instrument.enable(lambda kind, name, value, info: events.append((kind, name)))
+    instrument.enable(instrument.logHandler())
+    try:
+        with caplog.at_level(logging.DEBUG, logger="pyelan"):
+            tier_set = tierSet(file=TEST_DATA_DIR / "Letters.eaf")
+            tierSet.writeElan(tier_set, dest=str(tmp_path / "out.eaf"))
+    finally:
+        instrument.disable()
+
+    assert ("span", "parse") in events
+    assert ("span", "timeSlots") in events
+    assert ("span", "writeElan") in events
+    assert instrument.stats()["counters"]["annotations"] == 59
+    assert instrument.stats()["timings"]["parse"]["calls"] == 1
+    assert any("parse took" in message for message in caplog.messages)
+
+    # nothing is recorded once it is off
+    instrument.reset()
+    tierSet(file=TEST_DATA_DIR / "Letters.eaf")
+    assert instrument.stats() == {"timings": {}, "counters": {}}
@@ -0,0 +1,20 @@
+import pytest
+import array, os
+
+from pyelan.mapped import mappedFiles
+
+def test_mapped_files(tmp_path):
+    with open(tmp_path / "a.i64", "wb") as fl:
+        array.array('q', [1, 2, 3]).tofile(fl)
+    (tmp_path / "empty.i64").write_bytes(b"")
+    files = mappedFiles(str(tmp_path))
+    view = files.view("a.i64", 'q')
+    assert list(view) == [1, 2, 3]
+    assert list(files.view("empty.i64", 'q')) == []
+
+    # views outlive close() and the file itself, and the file is mapped again when next asked for
+    files.close()
+    os.remove(tmp_path / "a.i64")
+    assert list(view) == [1, 2, 3]
+    with pytest.raises(FileNotFoundError):
+        files.view("a.i64", 'q')
@@ -0,0 +1,27 @@
+import pytest
+
+from pyelan.parallel import runJobs, poolSize
+
+_shared = None
+
+def _share(value):
+    global _shared
+    _shared = value
+
+def _divide(a, b):
+    return _shared * a / b
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_jobs(workers):
+    jobs = [(6, 3), (1, 0), (8, 2)]
+    results = {job: (result, error) for job, result, error, seconds in runJobs(_divide, jobs, workers, initializer=_share, initargs=(10,))}
+    assert results[(6, 3)] == (20., None)
+    assert results[(8, 2)] == (40., None)
+    # a failing job is reported with its traceback instead of stopping the others
+    assert results[(1, 0)][0] is None
+    assert "ZeroDivisionError" in results[(1, 0)][1]
+
+def test_pool_size():
+    assert poolSize(4, 10) == 4
+    assert poolSize(4, 1) == 1
+    assert poolSize(None, 10) >= 1
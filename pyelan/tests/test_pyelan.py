@@ -0,0 +1,241 @@
+import pytest
+from pathlib import Path
+
+from pyelan.pyelan import *
+
+TEST_DATA_DIR = Path(__file__).resolve().parent
+
+def test_iter_annotations():
+    tier_set = tierSet(file=TEST_DATA_DIR / "Letters.eaf")
+    streamed = list(tierSet.iterAnnotations(TEST_DATA_DIR / "Letters.eaf"))
+    expected = [(tr.tierName, anno) for tr in tier_set.tiers for anno in tr.annotations]
+    assert len(streamed) == len(expected) == 59
+    assert [(name, anno.begin, anno.end, anno.value) for name, anno in streamed] == \
+        [(name, anno.begin, anno.end, anno.value) for name, anno in expected]
+
+    # tiers that were not asked for are skipped
+    assert list(tierSet.iterAnnotations(TEST_DATA_DIR / "Letters.eaf", tierNames=["missing"])) == []
+    tiers = list(tierSet.iterTiers(TEST_DATA_DIR / "Letters.eaf", tierNames=["JK"]))
+    assert [tr.tierName for tr in tiers] == ["JK"]
+    assert len(tiers[0].annotations) == 59
+
+class trickle:
+    """A binary file that only gives a few bytes per read"""
+    def __init__(self, path, size):
+        self.fl, self.size = open(path, "rb"), size
+    def read(self, n=-1):
+        return self.fl.read(self.size)
+
+def test_iter_annotations_small_reads():
+    # tier tags and the ends of skipped tiers split across reads are still found
+    path = TEST_DATA_DIR / "Letters.eaf"
+    expected = [(name, anno.begin, anno.end, anno.value) for name, anno in tierSet.iterAnnotations(path)]
+    for size in (1, 5, 7, 64):
+        assert [(name, anno.begin, anno.end, anno.value) for name, anno in tierSet.iterAnnotations(trickle(path, size))] == expected
+        assert [tr.tierName for tr in tierSet.iterTiers(trickle(path, size), tierNames=["missing"])] == []
+        assert len(next(tierSet.iterTiers(trickle(path, size), tierNames=["JK"])).annotations) == 59
+
+def test_iter_tiers_skips_around_kept_tier(tmp_path):
+    dest = str(tmp_path / "three.eaf")
+    tiers = [tier(name, [annotation(i * 100, i * 100 + 50, name + "<TIER>" + str(i)) for i in range(20)]) for name in ("a", "b", "c")]
+    tierSet.writeElan(tierSet(media=[], tiers=tiers), dest=dest)
+    # a file that is not ascii compatible is read in full, but still only the tier asked for is given
+    wide = str(tmp_path / "wide.eaf")
+    with open(dest, encoding="utf-8") as src, open(wide, "w", encoding="utf-16") as out:
+        out.write(src.read().replace('encoding="UTF-8"', 'encoding="UTF-16"'))
+    for fl in (dest, trickle(dest, 3), wide):
+        kept = list(tierSet.iterTiers(fl, tierNames=["b"]))
+        assert [tr.tierName for tr in kept] == ["b"]
+        assert [anno.value for anno in kept[0].annotations] == ["b<TIER>" + str(i) for i in range(20)]
+
+def test_no_tiers_warns(tmp_path):
+    dest = str(tmp_path / "empty.eaf")
+    tierSet.writeElan(tierSet(media=[], tiers=[]), dest=dest)
+    with pytest.warns(UserWarning, match="Could not find any tiers"):
+        assert tierSet(file=dest).tiers == []
+
+def test_annotations_between():
+    tr = tier("test", [annotation(0, 10, "a"), annotation(5, 30, "b"), annotation(12, 15, "c"), annotation(40, 50, "d")])
+    assert [anno.value for anno in tr.annotationsBetween(10, 20)] == ["c"]
+    assert [anno.value for anno in tr.annotationsBetween(10, 20, overlap=True)] == ["b", "c"]
+    assert [anno.value for anno in tr.annotationsBetween(0, 100)] == ["a", "b", "c", "d"]
+
+    # the index follows changes to the annotations
+    tr.annotations.append(annotation(16, 18, "e"))
+    assert [anno.value for anno in tr.annotationsBetween(10, 20)] == ["c", "e"]
+
+    mini = tierSet.miniTier(tierSet(media=[], tiers=[tr], pathELAN="."), 10, 20)
+    assert [(anno.begin, anno.end) for anno in mini.tiers[0].annotations] == [(2, 5), (6, 8)]
+
+def test_time_index_in_place_edits():
+    tr = tier("test", [annotation(0, 1000, "a"), annotation(2000, 3000, "b")])
+    tier_set = tierSet(media=[], tiers=[tr], pathELAN=".")
+    assert [anno.value for anno in tierSet.miniTier(tier_set, 0, 1000).tiers[0].annotations] == ["a"]
+
+    # converting the whole tier updates the index
+    tierSet.millisToFrames(tier_set, fps=30)
+    assert [anno.value for anno in tierSet.miniTier(tier_set, 0, 40).tiers[0].annotations] == ["a"]
+
+    # editing individual annotations in place needs a reindex
+    for anno in tr.annotations:
+        anno.framesToMillis(fps=30)
+    assert [anno.value for anno in tr.reindex().annotationsBetween(0, 1100)] == ["a"]
+    tr.annotations[1] = annotation(5, 10, "c")
+    tr.reindex()
+    assert [anno.value for anno in tr.annotationsBetween(0, 20)] == ["c"]
+    assert [a.value for a, b in joinTiers(tr, tier("w", [annotation(0, 20, "w")]), how="within")] == ["c"]
+
+    columnar = columnarTier("test", [0, 2000], [1000, 3000], ["a", "b"])
+    assert [anno.value for anno in columnar.annotationsBetween(0, 1000)] == ["a"]
+    columnar.shift(-1900)
+    assert [anno.value for anno in columnar.annotationsBetween(0, 1100)] == ["b"]
+    columnar.begins[0] = 100
+    columnar.ends[0] = 200
+    columnar.reindex()
+    assert [anno.value for anno in columnar.annotationsBetween(0, 1100)] == ["a", "b"]
+
+def test_columnar_tier():
+    tier_set = tierSet(file=TEST_DATA_DIR / "Letters.eaf")
+    columnar_set = tierSet(file=TEST_DATA_DIR / "Letters.eaf", columnar=True)
+    tr = columnar_set.tiers[0]
+    assert isinstance(tr, columnarTier)
+    assert [(anno.begin, anno.end, anno.value) for anno in tr.annotations] == \
+        [(anno.begin, anno.end, anno.value) for anno in tier_set.tiers[0].annotations]
+
+    tr = columnarTier("test", [0, 5, 12], [10, 30, 15], ["a", "b", "a"])
+    assert [anno.value for anno in tr.annotationsBetween(10, 20, overlap=True)] == ["b", "a"]
+    assert list(tr.filter(["a"]).begins) == [0, 12]
+    tr.shift(100)
+    assert list(tr.begins) == [100, 105, 112]
+    assert [anno.value for anno in tr.between(110, 120).annotations] == ["a"]
+    assert tr.values[0] is tr.values[2]
+
+def test_batch_unit_conversion():
+    scalar = tierSet(file=TEST_DATA_DIR / "Letters.eaf")
+    batch = tierSet(file=TEST_DATA_DIR / "Letters.eaf")
+    columnar = tierSet(file=TEST_DATA_DIR / "Letters.eaf", columnar=True)
+
+    expected = [anno.millisToFrames(fps=30) for anno in scalar.tiers[0].annotations]
+    tierSet.millisToFrames(batch, tierFps={"JK": 30})
+    tierSet.millisToFrames(columnar, fps=30)
+    for tr in (batch.tiers[0], columnar.tiers[0]):
+        assert [(anno.begin, anno.end, anno.units) for anno in tr.annotations] == \
+            [(anno.begin, anno.end, anno.units) for anno in expected]
+
+    expected = [anno.framesToMillis() for anno in expected]
+    tierSet.framesToMillis(batch)
+    columnar.tiers[0].framesToMillis()
+    for tr in (batch.tiers[0], columnar.tiers[0]):
+        assert [(anno.begin, anno.end, anno.units) for anno in tr.annotations] == \
+            [(anno.begin, anno.end, anno.units) for anno in expected]
+
+def test_dir_index(tmp_path):
+    for sub in ("a/session1", "b/session2", "b/session1/extra"):
+        (tmp_path / sub).mkdir(parents=True)
+        (tmp_path / sub / "clip.mov").write_text("")
+    cache = tmp_path / "index.json"
+
+    index = dirIndex(tmp_path, cacheFile=cache)
+    assert len(index.matches("clip.mov")) == 3
+    assert index.findPathMatch("/old/root/a/session1/clip.mov") == str(tmp_path / "a" / "session1" / "clip.mov")
+    assert findPathMatch("/old/b/session2/clip.mov", searchDir=tmp_path) == str(tmp_path / "b" / "session2" / "clip.mov")
+    with pytest.warns(UserWarning):
+        assert index.findPathMatch("/old/missing.mov") == "/old/missing.mov"
+
+    # the cache is reused until a directory changes
+    assert dirIndex(tmp_path, cacheFile=cache).paths == index.paths
+    (tmp_path / "a" / "session1" / "other.mov").write_text("")
+    assert len(dirIndex(tmp_path, cacheFile=cache).matches("other.mov")) == 1
+
+def test_lcs():
+    assert lcs("", "abc") == 0
+    assert lcs("abcde", "ace") == 3
+    assert lcs("ace", "abcde") == 3
+    assert lcs("/old/a/b/clip.mov", "/new/a/b/clip.mov") == 14
+
+def test_write_elan(tmp_path):
+    tier_set = tierSet(file=TEST_DATA_DIR / "Letters.eaf")
+    tier_set.tiers.append(tier("empty", []))
+    tier_set.tiers.append(tier("escaped <&>\"", [annotation(1, 2, "café & <b>"), annotation(3, 4, "")]))
+    tier_set.linkedFiles = [str(tmp_path / "data.csv")]
+
+    tierSet.elanOut(tier_set, dest=str(tmp_path / "tree.eaf")).write(tmp_path / "tree.eaf")
+    tierSet.writeElan(tier_set, dest=str(tmp_path / "streamed.eaf"))
+    assert (tmp_path / "streamed.eaf").read_bytes() == (tmp_path / "tree.eaf").read_bytes()
+
+def test_escaping_matches_element_tree():
+    from pyelan.pyelan import _escapeAttrib, _escapeText
+    for value in ["plain", "a & b", "<tag>", 'say "hi"', "tab\tline\nreturn\r", "&amp; already", "caf\u00e9 \u2192 ok"]:
+        elem = ElementTree.Element("A", V=value)
+        elem.text = value
+        assert ElementTree.tostring(elem, encoding="unicode") == '<A V="%s">%s</A>' % (_escapeAttrib(value), _escapeText(value))
+
+def test_shared_time_slots(tmp_path):
+    tier_set = tierSet(media=[], tiers=[
+        tier("a", [annotation(0, 10, "x"), annotation(10, 20, "y")]),
+        tier("b", [annotation(0, 20, "z")]),
+    ], pathELAN=str(tmp_path))
+    out = tierSet.elanOut(tier_set, dest=str(tmp_path / "tree.eaf"), sharedTimeSlots=True)
+    out.write(tmp_path / "tree.eaf")
+    slots = out.getroot()[1]
+    assert [(slot.attrib["TIME_SLOT_ID"], slot.attrib["TIME_VALUE"]) for slot in slots] == [("ts1", "0"), ("ts2", "10"), ("ts3", "20")]
+
+    tierSet.writeElan(tier_set, dest=str(tmp_path / "streamed.eaf"), sharedTimeSlots=True)
+    assert (tmp_path / "streamed.eaf").read_bytes() == (tmp_path / "tree.eaf").read_bytes()
+    read = tierSet(file=str(tmp_path / "streamed.eaf"))
+    assert [[(anno.begin, anno.end, anno.value) for anno in tr.annotations] for tr in read.tiers] == \
+        [[(0, 10, "x"), (10, 20, "y")], [(0, 20, "z")]]
+
+def test_unaligned_time_slots(tmp_path):
+    eaf = (TEST_DATA_DIR / "Letters.eaf").read_text()
+    eaf = eaf.replace('TIME_SLOT_ID="ts2" TIME_VALUE="95373"', 'TIME_SLOT_ID="ts2"')
+    (tmp_path / "unaligned.eaf").write_text(eaf)
+    first = next(tierSet.iterAnnotations(tmp_path / "unaligned.eaf"))[1]
+    # halfway between ts1 (95372) and ts3 (112323)
+    assert (first.begin, first.end) == (95372, 103847)
+
+def test_selected_tiers_while_parsing():
+    assert tierSet(file=TEST_DATA_DIR / "Letters.eaf", tierNames=["missing"]).tiers == []
+    tier_set = tierSet(file=TEST_DATA_DIR / "Letters.eaf", tierNames=["JK"], window=(95000, 118000))
+    assert [tr.tierName for tr in tier_set.tiers] == ["JK"]
+    assert [(anno.begin, anno.end) for anno in tier_set.tiers[0].annotations] == \
+        [(95372, 95373), (112323, 112324), (113883, 113884), (117132, 117133)]
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_segment(tmp_path, workers):
+    tier_set = tierSet(file=TEST_DATA_DIR / "Letters.eaf")
+    windows = [(110000, 130000, "b"), (95000, 115000, "a"), (200000, 210000, "empty")]
+    paths = tierSet.segment(tier_set, windows, str(tmp_path / "clips" / "{name}.eaf"), workers=workers)
+    assert paths == [str(tmp_path / "clips" / (name + ".eaf")) for name in ("b", "a", "empty")]
+
+    for (begin, end, name), path in zip(windows, paths):
+        expected = tierSet.elanOut(tierSet.miniTier(tier_set, begin, end), dest=str(tmp_path / "clips" / "expected.eaf"))
+        expected.write(tmp_path / "clips" / "expected.eaf")
+        assert (tmp_path / "clips" / "expected.eaf").read_bytes() == open(path, "rb").read()
+
+def test_time_index_sweep():
+    index = tier("test", [annotation(0, 10, "a"), annotation(5, 30, "b"), annotation(12, 15, "c"), annotation(40, 50, "d")]).timeIndex()
+    windows = [(10, 20), (0, 100), (35, 45)]
+    assert index.sweep(windows) == [index.query(*window) for window in windows]
+    assert index.sweep(windows, overlap=True) == [index.query(*window, overlap=True) for window in windows]
+
+def test_join_tiers():
+    clips = tier("clips", [annotation(100, 200, "c2"), annotation(0, 50, "c1"), annotation(300, 310, "c3")])
+    glosses = tier("glosses", [annotation(10, 20, "g1"), annotation(40, 60, "g2"), annotation(120, 130, "g3"), annotation(150, 250, "g4")])
+
+    def values(pairs):
+        return [(a.value, b.value) for a, b in pairs]
+
+    assert values(joinTiers(clips, glosses, "overlap")) == [("c2", "g3"), ("c2", "g4"), ("c1", "g1"), ("c1", "g2")]
+    assert values(joinTiers(clips, glosses, "contains")) == [("c2", "g3"), ("c1", "g1")]
+    assert values(joinTiers(glosses, clips, "within")) == [("g1", "c1"), ("g3", "c2")]
+    assert values(joinTiers(clips, glosses, "nearest")) == [("c2", "g3"), ("c1", "g1"), ("c3", "g4")]
+    with pytest.raises(ValueError):
+        joinTiers(clips, glosses, "before")
+
+    tier_set = tierSet(media=[], tiers=[clips, glosses], pathELAN=".")
+    assert values(tierSet.join(tier_set, "clips", "glosses", how="contains")) == [("c2", "g3"), ("c1", "g1")]
+
+    # the sweep agrees with comparing every pair
+    brute = [(a, b) for a in clips.annotations for b in glosses.annotations if a.begin < b.end and b.begin < a.end]
+    assert joinTiers(clips, glosses) == brute
@@ -0,0 +1,63 @@
+import pytest
+import os
+from pathlib import Path
+
+from pyelan.pyelan import *
+from pyelan.relPathFix import relinkFiles
+
+def make_moved_corpus(root, sessions=2):
+    """Writes eaf files whose media and tsconf links point at an old location, with the real files under root/data"""
+    data = root / "data"
+    data.mkdir()
+    eafs = []
+    for n in range(sessions):
+        (data / ("session%d.mov" % n)).write_text("")
+        (data / ("session%d.csv" % n)).write_text("0,1\n")
+        ts = timeSeries(source="/old/data/session%d.csv" % n, tracks=[track("t", 1, range=[0, 1], properties={})])
+        timeSeries.timeSeriesOut(ts)[0].write(data / "shared_tsconf.xml")
+        tiers = tierSet(media=["/old/data/session%d.mov" % n], linkedFiles=["/old/data/shared_tsconf.xml"],
+                        tiers=[tier("default", [annotation(1, 2, "foo")])], pathELAN=str(root))
+        eaf = root / ("session%d.eaf" % n)
+        tierSet.elanOut(tiers, dest=str(eaf)).write(eaf)
+        eafs.append(str(eaf))
+    return eafs
+
+@pytest.mark.filterwarnings("ignore:Could not find the media file")
+@pytest.mark.parametrize("workers", [1, 2])
+def test_relink_files(tmp_path, workers):
+    eafs = make_moved_corpus(tmp_path)
+    eafs.append(str(tmp_path / "missing.eaf"))
+    results = relinkFiles(eafs, searchDir=tmp_path, workers=workers)
+
+    byFile = {result.file: result for result in results}
+    assert not byFile[str(tmp_path / "missing.eaf")].ok
+    # the tsconf shared by both eaf files is only fixed once
+    tsconf = str(tmp_path / "data" / "shared_tsconf.xml")
+    assert [result.file for result in results if result.kind == "tsconf"] == [tsconf]
+    assert byFile[tsconf].ok
+
+    fixed = tierSet(file=eafs[0])
+    assert fixed.media == [str(tmp_path / "data" / "session0.mov")]
+    assert fixed.linkedFiles == [tsconf]
+    assert timeSeries(file=tsconf).source == str(tmp_path / "data" / "session1.csv")
+
+@pytest.mark.filterwarnings("ignore:Could not find the media file")
+def test_relink_dry_run_and_unchanged(tmp_path):
+    eafs = make_moved_corpus(tmp_path, sessions=1)
+    before = Path(eafs[0]).read_bytes()
+
+    results = relinkFiles(eafs, searchDir=tmp_path, workers=1, dryRun=True)
+    assert (("/old/data/session0.mov", str(tmp_path / "data" / "session0.mov"))) in results[0].changes
+    assert Path(eafs[0]).read_bytes() == before
+    assert not os.path.exists(eafs[0] + ".bak")
+
+    relinkFiles(eafs, searchDir=tmp_path, workers=1)
+    assert os.path.exists(eafs[0] + ".bak")
+    os.remove(eafs[0] + ".bak")
+
+    # nothing changes on a second run, so nothing is rewritten or backed up
+    mtime = os.stat(eafs[0]).st_mtime_ns
+    results = relinkFiles(eafs, searchDir=tmp_path, workers=1)
+    assert all(result.ok and result.changes == [] for result in results)
+    assert os.stat(eafs[0]).st_mtime_ns == mtime
+    assert not os.path.exists(eafs[0] + ".bak")
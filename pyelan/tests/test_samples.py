@@ -0,0 +1,100 @@
+import pytest
+import os
+import pickle
+import shutil
+
+from pyelan.pyelan import timeSeries, track
+from pyelan.samples import sampleData
+
+def make_time_series(tmp_path, timeOrigin=None):
+    source = tmp_path / "data.csv"
+    with open(source, "w") as fl:
+        fl.write("time,a,b\n")
+        for n in range(100):
+            fl.write("%d,%d,%d\n" % (n * 10, n, -n))
+    tracks = [track("a", 1, properties={}), track("b", "2", properties={})]
+    return timeSeries(source=str(source), timeOrigin=timeOrigin, tracks=tracks)
+
+def test_samples(tmp_path):
+    ts = make_time_series(tmp_path)
+    data = ts.samples(cacheDir=str(tmp_path / "cache"))
+    assert len(data) == 100
+    assert list(ts.trackValues("b")[0:3]) == [0., -1., -2.]
+
+    window = ts.window(100, 130)
+    assert list(window["a"]) == [10., 11., 12., 13.]
+    assert list(ts.window(100, 120, tracks=["b"])["b"]) == [-10., -11., -12.]
+    # the cache is reused, and columns that weren't cached are added on demand
+    assert list(ts.samples().column(0)[0:2]) == [0., 10.]
+
+    # time series can still be pickled once their samples have been opened
+    assert pickle.loads(pickle.dumps(ts)).tracks[0].name == "a"
+
+def test_samples_cache_location(tmp_path, user_cache_dir):
+    ts = make_time_series(tmp_path)
+    assert ts.samples().cacheDir.startswith(str(user_cache_dir))
+    assert not (tmp_path / "data.csv.pyelan-cache").exists()
+    beside = make_time_series(tmp_path)
+    assert len(beside.samples(besideSource=True)) == 100
+    assert (tmp_path / "data.csv.pyelan-cache" / "meta.json").exists()
+
+def test_samples_views_survive_rebuilds(tmp_path):
+    source = tmp_path / "data.csv"
+    source.write_text("".join("%d,%d,%d,%d\n" % (n * 10, n, 2 * n, 3 * n) for n in range(10)))
+    data = sampleData(str(source), [1])
+    first = data.column(1)
+    # a column that isn't cached yet rebuilds the cache, without touching views already handed out
+    assert list(data.column(3)[0:2]) == [0., 3.]
+    assert list(first[0:3]) == [0., 1., 2.]
+    data.close()
+    assert list(first[0:3]) == [0., 1., 2.]
+
+    # another reader rebuilding the same cache (e.g. after the csv changed) doesn't change mapped columns either
+    source.write_text("".join("%d,%d\n" % (n * 10, -n) for n in range(20)))
+    other = sampleData(str(source), [1])
+    assert list(other.column(1)[0:3]) == [0., -1., -2.]
+    assert list(first[0:3]) == [0., 1., 2.]
+    assert len(os.listdir(other.cacheDir)) == 2
+
+def test_samples_unmapped_column_after_rebuild(tmp_path):
+    source = tmp_path / "data.csv"
+    source.write_text("".join("%d,%d,%d,%d\n" % (n * 10, n, 2 * n, 3 * n) for n in range(10)))
+    first = sampleData(str(source), [1, 2])
+    assert list(first.column(1)[0:3]) == [0., 1., 2.]
+    # another reader adding a column replaces the build the first one opened, before it mapped column 2
+    second = sampleData(str(source), [3])
+    assert list(first.column(2)[0:3]) == [0., 2., 4.]
+    assert list(second.column(3)[0:3]) == [0., 3., 6.]
+
+    # a cache whose build was removed by hand is rebuilt
+    second.close()
+    for name in os.listdir(second.cacheDir):
+        if name.startswith("build-"):
+            shutil.rmtree(os.path.join(second.cacheDir, name))
+    assert list(sampleData(str(source), [1]).column(1)[0:3]) == [0., 1., 2.]
+
+def test_samples_time_origin(tmp_path):
+    ts = make_time_series(tmp_path, timeOrigin=50.)
+    assert list(ts.window(0, 20)["a"]) == [5., 6., 7.]
+
+def test_detect_ranges(tmp_path):
+    ts = make_time_series(tmp_path)
+    ts.tracks[0].properties["detect-range"] = "true"
+    ts.detectRanges()
+    assert [trk.range for trk in ts.tracks] == [[0., 99.], [-99., 0.]]
+    assert ts.tracks[0].properties["detect-range"] == "false"
+    rng = timeSeries.timeSeriesOut(ts)[0].getroot().find("tracksource/track/range")
+    assert (rng.attrib["min"], rng.attrib["max"]) == ("0.0", "99.0")
+
+def test_detect_ranges_unknown(tmp_path):
+    source = tmp_path / "data.csv"
+    source.write_text("".join("%d,%d,n/a\n" % (n * 10, n) for n in range(10)))
+    tracks = [track("a", 1, properties={"detect-range": "true"}), track("b", 2, range=[-1., 1.], properties={"detect-range": "true"})]
+    ts = timeSeries(source=str(source), tracks=tracks)
+    ts.detectRanges()
+    # a column without numbers keeps its range and leaves the detection to ELAN
+    assert ts.tracks[0].range == [0., 9.]
+    assert ts.tracks[1].range == [-1., 1.]
+    assert ts.tracks[1].properties["detect-range"] == "true"
+    rng = timeSeries.timeSeriesOut(ts)[0].getroot().findall("tracksource/track")[1].find("range")
+    assert (rng.attrib["min"], rng.attrib["max"]) == ("-1.0", "1.0")
@@ -0,0 +1,57 @@
+import pytest
+import shutil
+from pathlib import Path
+
+from pyelan import readTable
+from pyelan.corpus import loadCorpus
+from pyelan.pyelan import *
+
+TEST_DATA_DIR = Path(__file__).resolve().parent
+
+def annotations(tier_set):
+    return [(tr.tierName, [(anno.begin, anno.end, anno.value, anno.units) for anno in tr.annotations]) for tr in tier_set.tiers]
+
+def test_table_round_trip(tmp_path):
+    tier_set = tierSet(file=str(TEST_DATA_DIR / "Letters.eaf"))
+    tier_set.tiers.append(tier("notes", [annotation(0, 10, None), annotation(10, 20, "café ", units="frames")]))
+    dest = str(tmp_path / "letters.table")
+    assert tierSet.tableOut(tier_set, dest, source="Letters.eaf") == sum(len(tr.annotations) for tr in tier_set.tiers)
+
+    table = readTable(dest)
+    assert len(table) == sum(len(tr.annotations) for tr in tier_set.tiers)
+    assert table.files == ["Letters.eaf"]
+    assert table.values(len(table) - 2) == [None, "café"]
+    columns = table.columns()
+    assert columns["tier"][0] == tier_set.tiers[0].tierName
+    assert list(columns["begin"][0:3]) == [anno.begin for anno in tier_set.tiers[0].annotations[0:3]]
+    assert columns["units"][-1] == "frames"
+
+    read = table.tierSets()["Letters.eaf"]
+    assert all(isinstance(tr, columnarTier) for tr in read.tiers)
+    # a columnar tier has one unit type, taken from its first annotation
+    assert annotations(read)[:-1] == annotations(tier_set)[:-1]
+    assert list(table.tierSets(tierNames=["notes"])["Letters.eaf"].tiers[0].values) == [None, "café"]
+    begins = table.column("begin")
+    table.close()
+    # views handed out stay valid after the table is closed
+    assert list(begins[0:3]) == list(columns["begin"][0:3])
+
+def test_corpus_table(tmp_path):
+    for n in range(2):
+        shutil.copyfile(TEST_DATA_DIR / "Letters.eaf", tmp_path / ("session%d.eaf" % n))
+    loaded = loadCorpus(str(tmp_path / "*.eaf"), workers=1)
+    dest = str(tmp_path / "corpus.table")
+    loaded.tableOut(dest)
+    table = readTable(dest)
+    assert table.files == list(loaded.tierSets)
+    read = table.tierSets(files=[table.files[1]])
+    assert list(read) == [table.files[1]]
+    assert annotations(read[table.files[1]]) == annotations(loaded[table.files[1]])
+
+    # rewriting a table replaces it, and a table that was never finished is not read
+    tierSet.tableOut(tierSet(media=[], tiers=[]), dest)
+    assert len(readTable(dest)) == 0
+    assert [tiers.tiers for tiers in readTable(dest).tierSets().values()] == [[]]
+    (tmp_path / "corpus.table" / "meta.json").unlink()
+    with pytest.raises(ValueError):
+        readTable(dest)